@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import fnmatch
+import os
+import re
+
+import cache
+
+# bump whenever the layout of the compiled index changes so stale pickles are
+# rebuilt instead of misread
+index_version = 2
+
+wildcard_chars = "*?["
+
+
+# the part of a glob before its first wildcard - any path the glob matches
+# has to start with it.
+def literal_prefix(pattern):
+    for i, c in enumerate(pattern):
+        if c in wildcard_chars:
+            return pattern[:i]
+    return pattern
+
+
+# the longest run of plain characters in a glob - any path the glob matches has
+# to contain it, which makes for a very cheap pre-filter before running the
+# regex (globs starting with a wildcard all share the empty prefix).
+def required_literal(pattern):
+    best = ""
+    run_start = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in wildcard_chars:
+            if i - run_start > len(best):
+                best = pattern[run_start:i]
+            if c == "[":
+                # skip the bracket expression, matching fnmatch's rules for
+                # where it ends.  an unterminated one is treated as opaque.
+                j = i + 1
+                if j < len(pattern) and pattern[j] == "!":
+                    j += 1
+                if j < len(pattern) and pattern[j] == "]":
+                    j += 1
+                j = pattern.find("]", j)
+                if j < 0:
+                    return best
+                i = j
+            run_start = i + 1
+        i += 1
+
+    if len(pattern) - run_start > len(best):
+        best = pattern[run_start:]
+    return best
+
+
+def compile_index(modes):
+    """Build a lookup index from a parsed buck_auto_mode.toml.
+
+    Every path glob is stored (in file order) with the regex fnmatch would use
+    for it and a literal it requires, and globs are bucketed by literal prefix.
+    Projects keep everything except their path list.
+    """
+    projects = []
+    patterns = []
+    prefixes = {}
+    for project in modes.get("Project", []):
+        project_index = len(projects)
+        projects.append({k: v for k, v in project.items() if k != "paths"})
+        for pattern in project.get("paths", []):
+            pattern = os.path.normcase(pattern)
+            prefix = literal_prefix(pattern)
+            prefixes.setdefault(prefix, []).append(len(patterns))
+            patterns.append(
+                (fnmatch.translate(pattern), required_literal(pattern), project_index)
+            )
+
+    return {
+        "version": index_version,
+        "projects": projects,
+        "patterns": patterns,
+        "prefixes": prefixes,
+    }
+
+
+class AutoModeResolver:
+    """Maps enlistment-relative paths to their buck_auto_mode.toml project.
+
+    The parsed and compiled index is pickled into the b cache directory, keyed
+    by the mode file's path and invalidated by its mtime/size, so the TOML is
+    only decoded when it actually changes.
+    """
+
+    def __init__(self, auto_mode_file):
+        stamp = cache.file_stamp(auto_mode_file)
+        cache_name = cache.keyed_name("auto_mode", auto_mode_file, suffix=".pickle")
+
+        index = cache.read_pickle(cache_name)
+        if (
+            not isinstance(index, dict)
+            or index.get("version") != index_version
+            or index.get("stamp") != stamp
+        ):
+            import toml
+
+            index = compile_index(toml.load(auto_mode_file))
+            index["stamp"] = stamp
+            cache.write_pickle(cache_name, index)
+
+        self._projects = index["projects"]
+        self._patterns = index["patterns"]
+        self._prefixes = index["prefixes"]
+        self._compiled = {}
+
+    def find_project(self, path, section=None):
+        """Return the first project (in file order) with a glob matching path.
+
+        With a section name (a platform, say), projects where that section is
+        missing or empty are skipped over.
+        """
+        path = os.path.normcase(path)
+
+        # only globs whose literal prefix is a prefix of path can match, so we
+        # just need one dict probe per prefix length
+        candidates = []
+        for i in range(len(path) + 1):
+            ids = self._prefixes.get(path[:i])
+            if ids:
+                candidates.extend(ids)
+
+        for pattern_index in sorted(candidates):
+            regex, literal, project_index = self._patterns[pattern_index]
+            if literal not in path:
+                continue
+
+            compiled = self._compiled.get(pattern_index)
+            if compiled is None:
+                compiled = re.compile(regex)
+                self._compiled[pattern_index] = compiled
+
+            if compiled.match(path):
+                project = self._projects[project_index]
+                if section is None or project.get(section):
+                    return project
+
+        return None
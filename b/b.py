@@ -1,74 +1,168 @@
 #!/usr/bin/env python3
 
-import argparse
+# note the time before anything else is imported so --startup-profile can
+# account for the cost of our own imports
+from time import perf_counter
+
+startup_begin = perf_counter()
+
 import json
 import os
 import platform
+import re
 import subprocess
 import sys
 
-from fnmatch import fnmatch
-
+import cache
+import history
 import queries
-import toml
 
+from auto_mode import AutoModeResolver
+from build_report import BuildReport
 from common_tools import (
+    PhaseTimer,
     change_cwd,
     exec_lines,
     get_buck_root,
+    TargetRelativizer,
     pretty_targets,
     print_command,
     print_trimmed,
+    stream_lines,
     temporary_filename,
 )
 
+# nothing below this point may run a subprocess or parse a config file at import
+# time - update_compilation_database.py and run_clang_tidy.py import us too, and
+# everything they don't use should stay free.
+startup_profile = PhaseTimer(startup_begin)
+startup_profile.mark("imports")
+
+# time spent in the work commands do (maybe several times over) - recorded in
+# the timing history together with the startup phases
+phase_timings = PhaseTimer()
+
+# files buck looks for while walking up from the cwd to decide which cell and
+# project we're in - if none of these changed, neither did the answer.
+root_marker_files = [".buckconfig", ".buckconfig.local", ".buckroot"]
+
+# keep the persistent root cache from growing without bound
+max_root_cache_entries = 256
+
+
+def get_root_stamps(path):
+    stamps = {}
+    while True:
+        for marker in root_marker_files:
+            marker_path = os.path.join(path, marker)
+            stamps[marker_path] = cache.file_stamp(marker_path)
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    return stamps
+
+
+# Persistent cache of root discovery results for the current directory.
+# Stored in function attribute, backed by roots.json in the cache directory.
+def get_root_cache_entry():
+    if not hasattr(get_root_cache_entry, "inner"):
+        cwd = os.getcwd()
+        stamps = get_root_stamps(cwd)
+        entry = cache.read_json("roots.json", {}).get(cwd)
+        if not entry or entry.get("stamps") != stamps:
+            entry = {"stamps": stamps}
+
+        get_root_cache_entry.cwd = cwd
+        get_root_cache_entry.inner = entry
+
+    return get_root_cache_entry.inner
+
+
+def save_root_cache_entry():
+    entries = cache.read_json("roots.json", {})
+    entries.pop(get_root_cache_entry.cwd, None)
+    entries[get_root_cache_entry.cwd] = get_root_cache_entry.inner
+    while len(entries) > max_root_cache_entries:
+        del entries[next(iter(entries))]
+
+    cache.write_json("roots.json", entries)
+
+
 # Lazily compute buck_root. Stored in function attribute.
 def get_buck_root():
     if not hasattr(get_buck_root, "inner"):
-        result = subprocess.run(
-            ["buck2", "root"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
-        )
-        result = result.stdout.decode("utf-8")
-        get_buck_root.inner = result.strip()
+        entry = get_root_cache_entry()
+        if "root" not in entry:
+            with phase_timings.measure("root discovery"):
+                result = subprocess.run(
+                    ["buck2", "root"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+                )
+            result = result.stdout.decode("utf-8").strip()
+            if not result:
+                # don't remember failures, buck may just be having a bad day
+                return result
+
+            entry["root"] = result
+            save_root_cache_entry()
+
+        get_buck_root.inner = entry["root"]
 
     return get_buck_root.inner
 
 
 def get_absolute_buck_root():
     if not hasattr(get_absolute_buck_root, "inner"):
-        root = get_buck_root()
-        parent = os.path.dirname(root)
-        while True:
-            try:
-                with change_cwd(parent):
-                    next = subprocess.run(
-                        ["buck2", "root"],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.DEVNULL,
-                    )
-
-                next = next.stdout.decode("utf-8").strip()
-                if not next:
+        entry = get_root_cache_entry()
+        if "absolute_root" not in entry:
+            root = get_buck_root()
+            parent = os.path.dirname(root)
+            while True:
+                try:
+                    with change_cwd(parent), phase_timings.measure("root discovery"):
+                        next = subprocess.run(
+                            ["buck2", "root"],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL,
+                        )
+
+                    next = next.stdout.decode("utf-8").strip()
+                    if not next:
+                        break
+
+                    root = next
+                    parent = os.path.dirname(root)
+                except subprocess.CalledProcessError:
                     break
 
-                root = next
-                parent = os.path.dirname(root)
-            except subprocess.CalledProcessError:
-                break
+            if not root:
+                return root
+
+            entry["absolute_root"] = root
+            save_root_cache_entry()
 
-        get_absolute_buck_root.inner = root
+        get_absolute_buck_root.inner = entry["absolute_root"]
 
     return get_absolute_buck_root.inner
 
 
 def get_cell_root(cell: str):
     if not hasattr(get_cell_root, "cells"):
-        cells = {}
-        for line in exec_lines(["buck2", "audit", "cell"], quiet=True):
-            c, p = line.split(": ", 2)
-            cells[c] = p
+        entry = get_root_cache_entry()
+        if "cells" not in entry:
+            cells = {}
+            with phase_timings.measure("root discovery"):
+                lines = exec_lines(["buck2", "audit", "cell"], quiet=True)
+            for line in lines:
+                c, p = line.split(": ", 2)
+                cells[c] = p
 
-        get_cell_root.cells = cells
+            entry["cells"] = cells
+            save_root_cache_entry()
+
+        get_cell_root.cells = entry["cells"]
 
     cells = get_cell_root.cells
     return cells[cell]
@@ -134,43 +228,51 @@ def get_default_buck():
 default_buck = get_default_buck()
 
 
+# Lazily load the auto-mode resolver. Stored in function attribute.
+def get_auto_mode_resolver():
+    if not hasattr(get_auto_mode_resolver, "inner"):
+        auto_mode_file = get_target_path(
+            "fbcode//buck_auto_mode/data/buck_auto_mode.toml"
+        )
+        get_auto_mode_resolver.inner = AutoModeResolver(auto_mode_file)
+
+    return get_auto_mode_resolver.inner
+
+
 def get_target_auto_data(target: str, flavor: str):
-    auto_mode_file = get_target_path("fbcode//buck_auto_mode/data/buck_auto_mode.toml")
-    modes = toml.load(auto_mode_file)
     target_path = get_target_path(target)
     absolute_buck_root = get_absolute_buck_root()
     target_path = (
         os.path.relpath(target_path, absolute_buck_root).replace("\\", "/") + "/"
     )
 
-    for project in modes["Project"]:
-        for pattern in project["paths"]:
-            if fnmatch(target_path, pattern):
-                platform_section = project.get(platform.system().lower(), None)
-                if platform_section:
-                    for f in [flavor, "dev", "dbg", "opt", "asan", "tsan"]:
-                        if f in platform_section:
-                            chosen_mode = ""
-                            if isinstance(platform_section[f], list):
-                                chosen_mode = platform_section[f][0]
-                            else:
-                                chosen_mode = platform_section[f]
-
-                            chosen_buck = project["build"]
-                            if chosen_buck == "fbcode-contbuild":
-                                chosen_buck = "buck2"
-
-                            # now we have to make the chosen mode relative to our local buck root:
-                            return (
-                                chosen_buck,
-                                "@//"
-                                + os.path.relpath(
-                                    os.path.join(get_absolute_buck_root(), chosen_mode),
-                                    get_buck_root(),
-                                ),
-                            )
-
-                    return (None, None)
+    # projects without a section for this platform don't count as a match
+    platform_name = platform.system().lower()
+    project = get_auto_mode_resolver().find_project(target_path, platform_name)
+    if project:
+        platform_section = project[platform_name]
+        for f in [flavor, "dev", "dbg", "opt", "asan", "tsan"]:
+            if f in platform_section:
+                chosen_mode = ""
+                if isinstance(platform_section[f], list):
+                    chosen_mode = platform_section[f][0]
+                else:
+                    chosen_mode = platform_section[f]
+
+                chosen_buck = project["build"]
+                if chosen_buck == "fbcode-contbuild":
+                    chosen_buck = "buck2"
+
+                # now we have to make the chosen mode relative to our local buck root:
+                return (
+                    chosen_buck,
+                    "@//"
+                    + os.path.relpath(
+                        os.path.join(get_absolute_buck_root(), chosen_mode),
+                        get_buck_root(),
+                    ),
+                )
+
     return (None, None)
 
 
@@ -188,9 +290,13 @@ def get_target_auto_buck(target: str, flavor: str):
 
 
 vs_path = "c:\\Program Files (x86)\\Microsoft Visual Studio\\2019\\Professional\\Common7\\IDE\\devenv.exe"
-windbg_path = os.path.join(
-    get_buck_root(), "third-party/toolchains/windows10sdk/Debuggers/x64/windbg.exe"
-)
+
+
+def get_windbg_path():
+    return os.path.join(
+        get_buck_root(), "third-party/toolchains/windows10sdk/Debuggers/x64/windbg.exe"
+    )
+
 
 default_target = queries.all_targets
 
@@ -201,22 +307,29 @@ def filter_mode(args):
     )
 
 
+# per-target durations from the build reports of this run, for the history
+target_durations = {}
+
+
 def invoke_buck(tool, args, report=True):
     with temporary_filename() as report_file:
         cmd = [tool] + args
         if report:
             cmd.extend(["--build-report", report_file])
         print_command(cmd)
-        result = subprocess.call(cmd)
+        with phase_timings.measure("buck invocation"):
+            result = subprocess.call(cmd)
         if result != 0:
             print("buck exited with errors")
             sys.exit(result)
 
         if report:
-            with open(report_file, "r") as r:
-                build_database = json.load(r)
-
-            return build_database
+            with phase_timings.measure("report parsing"):
+                build_report = BuildReport.load(report_file)
+            for r in build_report.results():
+                if r.duration != None:
+                    target_durations[r.target] = r.duration
+            return build_report
 
 
 # TODO - we should offer an option to exit at prompt or suppress input
@@ -273,8 +386,8 @@ def find_output_or_fail(target):
         sys.exit(1)
 
 
-def find_runnable(target, modes, results):
-    runnable = find_output(results[target])
+def find_runnable(target, modes, report):
+    runnable = report[target].output
     if runnable != None:
         return [runnable], os.environ
 
@@ -291,11 +404,10 @@ def find_runnable(target, modes, results):
 def buck_run(tool, modes, target, rest):
     buck_rest, debug_rest = get_passthru_args(rest)
 
-    build_database = buck_build(tool, modes, target, buck_rest)
-    results = build_database["results"]
-    target = prompt_target("choose run target: ", results)
-    if results[target]["success"]:
-        runnable, env = find_runnable(target, modes, results)
+    report = buck_build(tool, modes, target, buck_rest)
+    target = prompt_target("choose run target: ", report.targets())
+    if report[target].success:
+        runnable, env = find_runnable(target, modes, report)
         cmd = (
             [os.path.join(get_absolute_buck_root(), runnable[0])]
             + runnable[1:]
@@ -365,7 +477,7 @@ def run_windbg_debugger(binary, env, dbg_params, exe_params):
     # If we're on windows we just debug an exe - ideally we'd generate a temporary sln we can
     # find later so it would remember breakpoints and whatnot but we're not that smart yet, and
     # if folks want to get that fancy they can probably use vsgo
-    cmd = [windbg_path] + dbg_params + [binary] + exe_params
+    cmd = [get_windbg_path()] + dbg_params + [binary] + exe_params
     print_command(cmd)
     return subprocess.Popen(cmd, env=env)
 
@@ -419,7 +531,7 @@ def run_vscode_debugger(binary, env, dbg_params, exe_params):
 
 
 def save_buck_query(tool, modes, query, output):
-    targets = buck_query(tool, modes, query)
+    targets = buck_query(modes, query)
     print(pretty_targets(targets))
     with open(output, "w") as f:
         for target in targets:
@@ -439,9 +551,13 @@ def buck_test(tool, modes, target, rest):
     return invoke_buck(tool, ["test"] + modes + [target] + rest, report=False)
 
 
-def buck_targets(tool, modes, target, rest):
+def stream_buck_targets(tool, modes, target, rest):
     cmd = [tool, "targets"] + modes + [target] + rest
-    return sorted(exec_lines(cmd))
+    return stream_query_lines(cmd, target, rest)
+
+
+def buck_targets(tool, modes, target, rest):
+    return sorted(stream_buck_targets(tool, modes, target, rest))
 
 
 def buck_install(tool, modes, target, rest):
@@ -450,11 +566,10 @@ def buck_install(tool, modes, target, rest):
 
 def buck_debug(tool, modes, target, rest):
     buck_rest, debug_rest = get_passthru_args(rest)
-    build_database = buck_build(tool, modes, target, buck_rest)
-    results = build_database["results"]
-    target = prompt_target("choose debug target: ", results)
-    if results[target]["success"]:
-        runnable, env = find_runnable(target, modes, results)
+    report = buck_build(tool, modes, target, buck_rest)
+    target = prompt_target("choose debug target: ", report.targets())
+    if report[target].success:
+        runnable, env = find_runnable(target, modes, report)
         exe = os.path.join(get_absolute_buck_root(), runnable[0])
 
         # rest for debugging is a little bit different - if there
@@ -476,27 +591,185 @@ def buck_debug(tool, modes, target, rest):
             run_vscode_debugger(exe, env, dbg_params, exe_params + runnable[1:])
 
 
-def buck_query(modes, query, rest=[], quiet=False):
+# query results are cached until a build file in the query's scope changes.
+# b.py --no-cache (or B_NO_CACHE=1) turns this off.
+query_cache_enabled = True
+
+build_file_names = {"BUCK", "TARGETS", "BUCK.v2", "TARGETS.v2"}
+
+# never holds build files we care about, and can be huge
+pruned_directories = {"buck-out", ".hg", ".git"}
+
+# the words of a query - target patterns are among them
+query_word_re = re.compile(r"[^\s'\"(),]+")
+
+
+# the build files a query can see, as (recursive, packages): directories whose
+# whole tree is in scope (pattern/...), and packages whose own build file is
+# (pattern:name).  relative patterns are resolved against the cwd.  queries
+# reaching outside these (deps() of something elsewhere, say) can go stale -
+# that's what --no-cache is for.
+def get_query_scope(query, rest):
+    recursive = set()
+    packages = set()
+    for word in query_word_re.findall(" ".join([query] + rest)):
+        # flags, and modes or argument files
+        if word.startswith(("-", "@")):
+            continue
+        package, colon, _ = word.partition(":")
+        if "//" not in package and not colon and not package.endswith("..."):
+            continue
+        directory = os.path.normpath(get_target_path(package))
+        if package.endswith("..."):
+            recursive.add(directory)
+        else:
+            packages.add(directory)
+
+    # no patterns at all (owner(file), say) - the cwd's build file is the best
+    # guess at what it depends on
+    if not recursive and not packages:
+        packages.add(os.path.normpath(os.getcwd()))
+
+    # a directory inside another one is walked as part of it
+    walked = []
+    for d in sorted(recursive):
+        if not walked or os.path.commonpath([walked[-1], d]) != walked[-1]:
+            walked.append(d)
+    packages = [
+        p for p in sorted(packages)
+        if not any(os.path.commonpath([d, p]) == d for d in walked)
+    ]
+    return walked, packages
+
+
+# the stamps of every build file in scope, plus the directories they were
+# found in: a build file appearing or disappearing changes its directory's
+# stamp, so re-stating these is enough to tell whether the scope changed
+# without walking it again
+def get_build_file_stamps(recursive, packages):
+    stamps = {}
+    for directory in packages:
+        stamps[directory] = cache.file_stamp(directory)
+        for name in build_file_names:
+            path = os.path.join(directory, name)
+            stamp = cache.file_stamp(path)
+            if stamp != None:
+                stamps[path] = stamp
+
+    pending = list(recursive)
+    while pending:
+        directory = pending.pop()
+        stamps[directory] = cache.file_stamp(directory)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in pruned_directories:
+                            pending.append(entry.path)
+                    elif entry.name in build_file_names:
+                        st = entry.stat()
+                        stamps[entry.path] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            pass
+
+    return stamps
+
+
+def build_files_changed(stamps):
+    return any(cache.file_stamp(path) != stamp for path, stamp in stamps.items())
+
+
+# the lines cmd prints, from the cache if nothing in the query's scope changed
+# since they were last fetched.  lines are yielded as they arrive either way,
+# in the order buck printed them.
+def stream_query_lines(cmd, query, rest, quiet=False):
+    # includes the time whoever consumes the lines spends between them
+    with phase_timings.measure("query"):
+        yield from _stream_query_lines(cmd, query, rest, quiet)
+
+
+def _stream_query_lines(cmd, query, rest, quiet):
+    if not query_cache_enabled or not cache.enabled:
+        yield from stream_lines(cmd, quiet=quiet)
+        return
+
+    name = cache.keyed_name(
+        "query", json.dumps(cmd), os.getcwd(), get_buck_root(), suffix=".json"
+    )
+    entry = cache.read_json(name)
+    if (
+        isinstance(entry, dict)
+        and isinstance(entry.get("stamps"), dict)
+        and not build_files_changed(entry["stamps"])
+    ):
+        yield from entry["results"]
+        return
+
+    # taken before the query runs, so edits made while it runs invalidate it
+    stamps = get_build_file_stamps(*get_query_scope(query, rest))
+    results = []
+    for line in stream_lines(cmd, quiet=quiet):
+        results.append(line)
+        yield line
+    cache.write_json(name, {"stamps": stamps, "results": results})
+
+
+def stream_buck_query(modes, query, rest=[], quiet=False):
     cmd = ["buck2", "query"] + modes + [query] + rest
-    return sorted(exec_lines(cmd, quiet=quiet))
+    return stream_query_lines(cmd, query, rest, quiet)
 
 
-def targets(tool, modes, query, rest=[]):
-    results = buck_targets(tool, modes, query, rest)
-    for t in pretty_targets(results):
-        print(t)
+def buck_query(modes, query, rest=[], quiet=False):
+    return sorted(stream_buck_query(modes, query, rest, quiet))
 
 
-def query(tool, modes, query, rest=[]):
-    results = buck_query(tool, modes, query, rest)
+# runs query once for each of args in a single buck invocation: every %s in the
+# query is replaced by the arg, and the (sorted) results are returned by arg.
+# pass "%s" as the query to run several unrelated queries at once, e.g.
+#   buck_query_many(modes, "%s", ["deps(//a:a)", "inputs(//b:b)"])
+def buck_query_many(modes, query, args, quiet=False):
+    if not args:
+        return {}
+
+    # the args go through a file - there can be far more than a command line holds
+    with temporary_filename() as args_file:
+        with open(args_file, "w") as f:
+            for arg in args:
+                f.write(arg + "\n")
+
+        cmd = ["buck2", "query"] + modes + [query, "--output-format", "json", f"@{args_file}"]
+        with phase_timings.measure("query"):
+            results = json.loads("\n".join(exec_lines(cmd, quiet=quiet)))
+
+    # a single arg isn't treated as a multi-query, so its results aren't keyed
+    if isinstance(results, list):
+        results = {args[0]: results}
+    return {arg: sorted(results.get(arg, [])) for arg in args}
+
+
+# results are printed as buck produces them - b.py --sort waits for them all
+# and sorts them first
+sort_output = False
+
+
+def print_results(results):
+    if sort_output:
+        results = sorted(results)
     for t in results:
         print(t)
 
 
+def targets(tool, modes, query, rest=[]):
+    relativize = TargetRelativizer(os.getcwd())
+    print_results(map(relativize, stream_buck_targets(tool, modes, query, rest)))
+
+
+def query(tool, modes, query, rest=[]):
+    print_results(stream_buck_query(modes, query, rest))
+
+
 def queryq(tool, modes, query, rest=[]):
-    results = buck_query(tool, modes, query, rest)
-    for t in results:
-        print(t)
+    print_results(stream_buck_query(modes, query, rest))
 
 
 def buildq(tool, modes, target, rest):
@@ -524,9 +797,7 @@ def debugq(tool, modes, target, rest):
 
 
 def targetsq(tool, modes, target, rest):
-    targets = buck_query(tool, modes, target, rest)
-    for t in targets:
-        print(t)
+    print_results(stream_buck_query(modes, target, rest))
 
 
 def resolve_modes(modes, target, rest):
@@ -575,14 +846,36 @@ if __name__ == "__main__":
         "tests": test_modes,
     }
 
+    # b.py's own switches are pulled out before the command line is interpreted
+    show_startup_profile = "--startup-profile" in sys.argv
+    if show_startup_profile:
+        sys.argv.remove("--startup-profile")
+    if "--no-cache" in sys.argv:
+        sys.argv.remove("--no-cache")
+        query_cache_enabled = False
+    if "--sort" in sys.argv:
+        sys.argv.remove("--sort")
+        sort_output = True
+
     if len(sys.argv) <= 1:
         print(f"usage: b command [@mode] [target/query] [options]")
         print(f" default mode: {default_mode}")
-        print(" commands [{}] ".format(", ".join(commands)))
+        print(" commands [{}] ".format(", ".join(list(commands) + ["stats"])))
         sys.exit(0)
 
     # first, common operations:
     command = sys.argv[1]
+
+    # b.py stats [command...] reads the timing history rather than running buck
+    if command == "stats":
+        history.print_stats(sys.argv[2:])
+        sys.exit(0)
+
+    # a typo isn't a run - it's not worth resolving modes for, or recording
+    if command not in commands:
+        print(f"unknown command: {command}")
+        sys.exit(1)
+
     modes, rest = filter_mode(sys.argv[2:])
     rest = list(rest)
     modes = list(modes)
@@ -610,9 +903,34 @@ if __name__ == "__main__":
         else:
             target = queries.all_targets
 
+    startup_profile.mark("arguments")
+
     # compute any auto-mode configuration
     modes = resolve_modes(modes, target, rest)
+    startup_profile.mark("mode resolution")
     buck_tool = get_target_auto_buck(target, "dbg")  # any flavor
-
-    # invoke the command
-    commands.get(command, lambda: "unknown command")(buck_tool, modes, target, rest)
+    startup_profile.mark("buck tool resolution")
+
+    if show_startup_profile:
+        startup_profile.report("startup", file=sys.stderr)
+
+    # invoke the command, recording where the time went whichever way it ends
+    status = 1
+    try:
+        commands[command](buck_tool, modes, target, rest)
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+        raise
+    finally:
+        phases = dict(startup_profile.phases)
+        phases.update(phase_timings.totals())
+        history.record(
+            command,
+            target,
+            modes,
+            phases,
+            perf_counter() - startup_begin,
+            target_durations,
+            status,
+        )
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import json
+
+# how much of a report is read at a time
+chunk_size = 1 << 20
+
+
+# the per-target part of a --build-report.  only what b.py consumes is kept -
+# a report for a large build can have hundreds of thousands of these.
+class TargetResult:
+    __slots__ = ("target", "success", "outputs", "duration")
+
+    def __init__(self, target, result):
+        self.target = target
+
+        # buck1 reports a bool, buck2 "SUCCESS" or "FAIL"
+        success = result.get("success")
+        self.success = success is True or success == "SUCCESS"
+
+        if "output" in result:
+            self.outputs = {"DEFAULT": [result["output"]]}
+        else:
+            self.outputs = result.get("outputs") or {}
+
+        # seconds, when the report carries a duration for the target
+        duration = result.get("duration_ms")
+        if duration != None:
+            duration = duration / 1000
+        else:
+            duration = result.get("duration")
+        self.duration = duration
+
+    # the default output, like find_output, or None
+    @property
+    def output(self):
+        default = self.outputs.get("DEFAULT")
+        return default[0] if default else None
+
+
+# decodes one json document a value at a time from a file, so the report is
+# never held in memory whole - neither as text nor as nested dicts.
+class _JsonStream:
+    def __init__(self, f):
+        self._file = f
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        more = self._file.read(chunk_size)
+        self._eof = not more
+        self._buffer = self._buffer[self._pos :] + more
+        self._pos = 0
+
+    def peek(self):
+        while True:
+            while (
+                self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n"
+            ):
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise ValueError("unexpected end of build report")
+            self._fill()
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise ValueError(f"expected {token!r} in build report")
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # most likely the value runs past the end of the buffer
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            if end == len(self._buffer) and not self._eof:
+                # a number (or literal) could carry on in the next chunk
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    # yields the (key, value) pairs of an object.  read_value(key), if given,
+    # reads the values instead of decoding them whole.
+    def items(self, read_value=None):
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, read_value(key) if read_value else self.value()
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("}")
+                return
+
+
+class BuildReport:
+    """A parsed buck --build-report.
+
+    Target results are streamed out of the report into TargetResult records
+    and indexed by target. Indexes only some callers need (by output, the
+    failures) are built on first use.
+    """
+
+    def __init__(self, results, fields):
+        self._results = results
+        self.fields = fields
+        self._by_output = None
+        self._failures = None
+
+    @classmethod
+    def load(cls, path):
+        results = {}
+        fields = {}
+        with open(path, "r") as f:
+            stream = _JsonStream(f)
+
+            # results are turned into records one at a time, everything else
+            # is decoded as is
+            def read_value(key):
+                if key != "results":
+                    return stream.value()
+                for target, result in stream.items():
+                    results[target] = TargetResult(target, result)
+
+            for key, value in stream.items(read_value):
+                if key != "results":
+                    fields[key] = value
+
+        return cls(results, fields)
+
+    @property
+    def success(self):
+        return self.fields.get("success") in (True, "SUCCESS")
+
+    def targets(self):
+        return list(self._results)
+
+    def results(self):
+        return self._results.values()
+
+    def __contains__(self, target):
+        return target in self._results
+
+    def __getitem__(self, target):
+        return self._results[target]
+
+    def get(self, target, default=None):
+        return self._results.get(target, default)
+
+    # the result whose outputs include path
+    def find_by_output(self, path):
+        if self._by_output == None:
+            self._by_output = {}
+            for result in self._results.values():
+                for outputs in result.outputs.values():
+                    for output in outputs:
+                        self._by_output[output] = result
+        return self._by_output.get(path)
+
+    def failures(self):
+        if self._failures == None:
+            self._failures = [r for r in self._results.values() if not r.success]
+        return self._failures
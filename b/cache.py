@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# persistent on-disk caches shared by b.py and the helper scripts.  everything
+# in here is best-effort: a missing, stale or corrupt cache file just means we
+# fall back to asking buck again.
+
+# set B_NO_CACHE=1 to bypass every cache (reads miss, writes are dropped)
+enabled = not os.getenv("B_NO_CACHE")
+
+
+def cache_dir():
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "b")
+
+
+def cache_path(name):
+    return os.path.join(cache_dir(), name)
+
+
+# a cheap fingerprint for a file - None if the file doesn't exist.  returned as
+# a list so it compares equal after a round trip through json.
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _write_atomic(path, data, mode):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except OSError:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+
+
+def read_json(name, default=None):
+    if not enabled:
+        return default
+    try:
+        with open(cache_path(name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(name, data):
+    if not enabled:
+        return
+    _write_atomic(cache_path(name), json.dumps(data, separators=(",", ":")), "w")
+
+
+def read_pickle(name, default=None):
+    if not enabled:
+        return default
+    try:
+        with open(cache_path(name), "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return default
+
+
+def write_pickle(name, data):
+    if not enabled:
+        return
+    _write_atomic(
+        cache_path(name), pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), "wb"
+    )
+
+
+# a stable cache file name for something identified by one or more strings
+# (paths, queries, ...), e.g. keyed_name("auto_mode", path, suffix=".pickle")
+def keyed_name(prefix, *parts, suffix=""):
+    digest = hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+    return f"{prefix}-{digest[:16]}{suffix}"
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-import argparse
 import contextlib
 import json
 import os
@@ -10,7 +9,7 @@ import sys
 import tempfile
 import platform
 
-from time import time
+from time import perf_counter, time
 from typing import List
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -75,27 +74,52 @@ def change_cwd(target_directory):
 
 # pretty targets should be shortened relative to the current path
 # to make them easier to read, but not shortened if copy/paste wouldn't
-# work.
-def relative_target(target, startpath):
-    startpath = os.path.normpath(os.path.abspath(startpath))
-    colon_index = target.rfind(":")
-    if target.startswith("//") and colon_index >= 0:
-        target_path = os.path.normpath(
-            os.path.join(get_buck_root(), target[2:colon_index])
-        )
-        if os.path.commonpath([startpath]) == os.path.commonpath(
-            [startpath, target_path]
-        ):
-            relative_target_path = os.path.relpath(target_path, startpath)
-            if relative_target_path == ".":
-                relative_target_path = ""
-            return relative_target_path.replace("\\", "/") + target[colon_index:]
+# work.  a target's shortened form only depends on its package, so each
+# package's prefix is worked out once and reused for every target in it.
+class TargetRelativizer:
+    def __init__(self, startpath):
+        self._startpath = os.path.normpath(os.path.abspath(startpath))
+        self._start_common = os.path.commonpath([self._startpath])
+        self._buck_root = None
+        self._prefixes = {}
+
+    # the replacement for "//package", or None if it should be left alone
+    def _prefix(self, package):
+        if self._buck_root == None:
+            self._buck_root = get_buck_root()
+
+        target_path = os.path.normpath(os.path.join(self._buck_root, package))
+        if self._start_common != os.path.commonpath([self._startpath, target_path]):
+            return None
 
-    return target
+        relative_target_path = os.path.relpath(target_path, self._startpath)
+        if relative_target_path == ".":
+            relative_target_path = ""
+        return relative_target_path.replace("\\", "/")
+
+    def __call__(self, target):
+        colon_index = target.rfind(":")
+        if not target.startswith("//") or colon_index < 0:
+            return target
+
+        package = target[2:colon_index]
+        if package in self._prefixes:
+            prefix = self._prefixes[package]
+        else:
+            prefix = self._prefix(package)
+            self._prefixes[package] = prefix
+
+        if prefix == None:
+            return target
+        return prefix + target[colon_index:]
+
+
+def relative_target(target, startpath):
+    return TargetRelativizer(startpath)(target)
 
 
 def pretty_targets(targets, startpath=os.getcwd()):
-    return sorted([relative_target(t, startpath) for t in targets])
+    return sorted(map(TargetRelativizer(startpath), targets))
 
 
 # hack to enable console coloring in cmd.exe
@@ -152,6 +176,23 @@ def exec_lines(cmd, stop_on_error=True, quiet=False):
     return result.decode("utf8").splitlines()
 
 
+# like exec_lines, but yields each line as soon as the command prints it rather
+# than waiting for the whole output.  the exit code is only known once the
+# output is exhausted, so a failure is reported after the lines that came
+# before it.
+def stream_lines(cmd, stop_on_error=True, quiet=False):
+    if not quiet:
+        print_command(cmd)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    with process:
+        for line in process.stdout:
+            yield line.decode("utf8").rstrip("\r\n")
+
+    if process.returncode != 0 and stop_on_error:
+        print("command failure: ", process.returncode)
+        sys.exit(1)
+
+
 def exec_cmd(cmd, stop_on_error=True, quiet=False):
     if not quiet:
         print_command(cmd)
@@ -231,3 +272,103 @@ class Timer:
         elapsed = now - self._start
         self._start = now
         print(f'{self._prefix}{msg} {(elapsed*1000):.2f}ms')
+
+
+# records how long a sequence of named phases took - call mark() at the end of
+# each phase, and report() to print a summary table.
+class PhaseTimer:
+    def __init__(self, start=None):
+        self._last = perf_counter() if start is None else start
+        self.phases = []
+
+    def mark(self, name):
+        now = perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    # records the time spent in the with block as its own phase, without
+    # moving the mark - for work that happens (maybe repeatedly) in between
+    @contextlib.contextmanager
+    def measure(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, perf_counter() - start))
+
+    def total(self):
+        return sum(elapsed for _, elapsed in self.phases)
+
+    # total time per phase name, in the order each was first seen
+    def totals(self):
+        totals = {}
+        for name, elapsed in self.phases:
+            totals[name] = totals.get(name, 0) + elapsed
+        return totals
+
+    def report(self, title="", file=None):
+        width = max([len(name) for name, _ in self.phases] + [len("total")])
+        if title:
+            print(f"{title}:", file=file)
+        for name, elapsed in self.phases:
+            print(f"  {name.ljust(width)} {(elapsed*1000):8.2f}ms", file=file)
+        print(f"  {'total'.ljust(width)} {(self.total()*1000):8.2f}ms", file=file)
+
+
+# the (st_dev, st_ino) identity of each path, or None for paths that can't be
+# stat'ed - what os.path.samefile compares, but fetched with one scandir per
+# directory rather than a stat per path.  symlinks (and anything scandir can't
+# vouch for) fall back to a regular, link following, stat.
+def file_identities(paths):
+    by_directory = {}
+    for path in paths:
+        by_directory.setdefault(os.path.dirname(path), {})[os.path.basename(path)] = path
+
+    identities = {}
+    for directory, names in by_directory.items():
+        try:
+            device = os.stat(directory or ".").st_dev
+            with os.scandir(directory or ".") as entries:
+                for entry in entries:
+                    path = names.get(entry.name)
+                    if path != None and not entry.is_symlink() and not entry.is_dir():
+                        identities[path] = (device, entry.inode())
+        except OSError:
+            pass
+
+        for path in names.values():
+            if path not in identities:
+                try:
+                    st = os.stat(path)
+                    identities[path] = (st.st_dev, st.st_ino)
+                except OSError:
+                    identities[path] = None
+
+    return identities
+
+
+# a set of files that answers "is this the same file as one of them?" with a
+# dict lookup instead of an os.path.samefile against every member.  paths naming
+# the same file are only kept once.
+class FileIndex:
+    def __init__(self, paths):
+        self._files = {}
+        identities = file_identities(paths)
+        for path in paths:
+            identity = identities[path]
+            if identity != None and identity not in self._files:
+                self._files[identity] = path
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self._files.values())
+
+    def __contains__(self, path):
+        return file_identities([path])[path] in self._files
+
+    # the paths (in order) that name a file in the index
+    def filter(self, paths):
+        identities = file_identities(paths)
+        return [p for p in paths if identities[p] in self._files]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import os
+import sys
+import time
+
+import cache
+
+# every b.py command appends one json line here with how long each of its
+# phases took.  nothing is ever rewritten, so concurrent commands can't lose
+# each other's records.
+history_file = "history.jsonl"
+
+# per-target build durations kept for each command - the slowest ones
+max_target_durations = 50
+
+# how many of the latest runs are compared against the ones before them
+recent_runs = 5
+baseline_runs = 50
+
+# a phase has regressed when its recent median is this much slower than its
+# baseline median, by at least min_regression seconds
+regression_ratio = 1.25
+min_regression = 0.05
+
+
+def record(command, target, modes, phases, total, target_durations=None, status=0):
+    entry = {
+        "time": time.time(),
+        "command": command,
+        "target": target,
+        "modes": modes,
+        "cwd": os.getcwd(),
+        "status": status,
+        "total": total,
+        "phases": phases,
+    }
+    if target_durations:
+        slowest = sorted(target_durations.items(), key=lambda t: t[1], reverse=True)
+        entry["targets"] = dict(slowest[:max_target_durations])
+
+    path = cache.cache_path(history_file)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one write of one line - appends of this size don't interleave
+        with open(path, "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    except OSError:
+        pass
+
+
+def load():
+    entries = []
+    try:
+        with open(cache.cache_path(history_file), "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # a line cut short by a crash, most likely
+                    pass
+    except OSError:
+        pass
+    return entries
+
+
+# nearest rank percentile of a sorted list
+def percentile(values, p):
+    rank = math.ceil(p / 100 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+def median(values):
+    return percentile(sorted(values), 50)
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    return f"{seconds:.2f}s"
+
+
+# {name: [durations, oldest first]} for a list of entries
+def collect(entries, field):
+    series = {}
+    for entry in entries:
+        for name, elapsed in entry.get(field, {}).items():
+            series.setdefault(name, []).append(elapsed)
+    return series
+
+
+def regressions(series):
+    found = []
+    for name, values in series.items():
+        if len(values) <= recent_runs:
+            continue
+        recent = median(values[-recent_runs:])
+        baseline = median(values[-(recent_runs + baseline_runs) : -recent_runs])
+        if recent > baseline * regression_ratio and recent - baseline > min_regression:
+            found.append((name, baseline, recent))
+    return found
+
+
+def print_table(series, file):
+    width = max([len(name) for name in series] + [len("phase")])
+    print(f"  {'phase'.ljust(width)} {'runs':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'last':>8}", file=file)
+    for name, values in series.items():
+        ordered = sorted(values)
+        print(
+            f"  {name.ljust(width)} {len(values):>5}"
+            f" {format_seconds(percentile(ordered, 50)):>8}"
+            f" {format_seconds(percentile(ordered, 90)):>8}"
+            f" {format_seconds(percentile(ordered, 99)):>8}"
+            f" {format_seconds(values[-1]):>8}",
+            file=file,
+        )
+
+
+# b.py stats [command...] - percentiles for each phase of each command, the
+# slowest targets, and anything that got slower recently
+def print_stats(commands=[], file=sys.stdout):
+    entries = load()
+    if commands:
+        entries = [e for e in entries if e.get("command") in commands]
+    if not entries:
+        print("no timing history yet", file=file)
+        return
+
+    by_command = {}
+    for entry in entries:
+        by_command.setdefault(entry.get("command"), []).append(entry)
+
+    for command, command_entries in by_command.items():
+        series = {"total": [e.get("total", 0) for e in command_entries]}
+        series.update(collect(command_entries, "phases"))
+        print(f"{command} ({len(command_entries)} runs):", file=file)
+        print_table(series, file)
+
+        for name, baseline, recent in regressions(series):
+            print(
+                f"  regression: {name} {format_seconds(baseline)} -> {format_seconds(recent)}"
+                f" (median of last {recent_runs} runs)",
+                file=file,
+            )
+
+        targets = collect(command_entries, "targets")
+        if targets:
+            print("  slowest targets (median):", file=file)
+            slowest = sorted(targets.items(), key=lambda t: median(t[1]), reverse=True)
+            for name, values in slowest[:10]:
+                print(f"    {format_seconds(median(values)):>8}  {name}", file=file)
+            for name, baseline, recent in regressions(targets):
+                print(
+                    f"  regression: {name} {format_seconds(baseline)} -> {format_seconds(recent)}",
+                    file=file,
+                )
+        print(file=file)
@@ -4,42 +4,109 @@ import fnmatch
 import glob
 import os
 import pathlib
+import re
 
 # DISCLAIMER!
 # the ignore syntax is very similar to .gitignore - but not
 # a complete implementation, nor is it at all optimal.  Don't
 # grab this thinking you're getting a gitignore parser
 
-# given a full file path,
-# returns true if the file should be ignored based on the
-# tree of ignore paths.
+# matches files against the tree of ignore files above them.  each ignore file
+# is read once, and its globs are compiled into a single regex; the rules that
+# apply to a directory, and whether the whole directory is ignored, are
+# remembered so checking every file in a tree stays cheap.
+class IgnoreMatcher:
+    def __init__(self, ignore_file=".clang-tidy-ignore"):
+        self.ignore_file = ignore_file
+        self._rules = {}
+        self._chains = {}
+        self._ignored_directories = {}
+
+    # the compiled rules of the ignore file in directory, or None
+    def rules(self, directory):
+        if directory not in self._rules:
+            regex = None
+            ignore_file_path = os.path.join(directory, self.ignore_file)
+            if os.path.isfile(ignore_file_path):
+                with open(ignore_file_path, "r") as f:
+                    # process globs and strip comments and trailing
+                    # newlines
+                    instructions = []
+                    for line in f.readlines():
+                        stripped = line.strip()
+                        if len(stripped) > 0 and not stripped.startswith("#"):
+                            instructions.append(stripped)
+
+                regex = compile_instructions(instructions)
+            self._rules[directory] = regex
+
+        return self._rules[directory]
+
+    # (directory, rules) for every ignore file from directory up to the root
+    def chain(self, directory):
+        if directory not in self._chains:
+            parent = os.path.dirname(directory)
+            chain = self.chain(parent) if parent != directory else []
+            regex = self.rules(directory)
+            if regex != None:
+                chain = [(directory, regex)] + chain
+            self._chains[directory] = chain
+
+        return self._chains[directory]
+
+    # a directory matched by a rule above it has every file below it matched
+    # too (patterns are checked both as globs and as directory prefixes), so
+    # the verdict is shared by all of them.
+    def directory_ignored(self, directory):
+        if directory not in self._ignored_directories:
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                ignored = False
+            else:
+                ignored = self.directory_ignored(parent) or self._matches(
+                    directory, self.chain(parent)
+                )
+            self._ignored_directories[directory] = ignored
+
+        return self._ignored_directories[directory]
+
+    def _matches(self, path, chain):
+        for directory, regex in chain:
+            relpath = path[len(directory.rstrip(os.sep)) + 1 :]
+            if regex.match(os.path.normcase(relpath)):
+                return True
+        return False
+
+    # given a full file path,
+    # returns true if the file should be ignored based on the
+    # tree of ignore paths.
+    def check(self, file):
+        file = os.path.abspath(file)
+        directory = os.path.dirname(file)
+        return self.directory_ignored(directory) or self._matches(
+            file, self.chain(directory)
+        )
+
+
 def check(file, ignore_file=".clang-tidy-ignore"):
-    closest_path = file
-
-    while True:
-        previous_path = closest_path
-        closest_path = os.path.dirname(previous_path)
-        if closest_path == previous_path:
-            break
-
-        ignore_file_path = os.path.join(closest_path, ignore_file)
-        if os.path.isfile(ignore_file_path):
-            with open(ignore_file_path, "r") as f:
-                lines = f.readlines()
-
-                # process globs and strip comments and trailing
-                # newlines
-                instructions = []
-                for line in lines:
-                    stripped = line.strip()
-                    if len(stripped) > 0 and not stripped.startswith("#"):
-                        instructions.append(stripped)
-
-                relpath = os.path.relpath(file, closest_path)
-                if match_file_ignore(relpath, instructions):
-                    return True
+    if not hasattr(check, "matchers"):
+        check.matchers = {}
+    if ignore_file not in check.matchers:
+        check.matchers[ignore_file] = IgnoreMatcher(ignore_file)
 
-    return False
+    return check.matchers[ignore_file].check(file)
+
+
+# one regex matching everything match_file_ignore would for instructions
+def compile_instructions(instructions):
+    patterns = []
+    for instruction in instructions:
+        for glob_pattern in (instruction, os.path.join(instruction, "*")):
+            patterns.append(fnmatch.translate(os.path.normcase(glob_pattern)))
+
+    if not patterns:
+        return None
+    return re.compile("|".join(patterns))
 
 
 def match_file_ignore(file, instructions):
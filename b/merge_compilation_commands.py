@@ -1,47 +1,594 @@
 #!/usr/bin/env python3
 
 import argparse
+import fnmatch
+import hashlib
 import json
+import mmap
 import os
+import re
+import struct
 import subprocess
+import sys
+import tempfile
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 
 import common_tools
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
 
-def merge_compilation_commands(sources, paths, output):
-    compile_commands = {}
+# how much of an input file is read at a time while streaming
+stream_chunk_size = 1 << 20
 
-    def import_file(input_path):
-        with open(input_path, "r") as input_file:
-            compile_set = json.load(input_file)
+
+default_jobs = os.cpu_count() or 1
+
+# directories the --sourcepath crawl never descends into, .gitignore style: a
+# pattern without a slash matches a directory name anywhere, one with a slash
+# matches the end of a directory's path.  buck-out is full of logs, caches and
+# scratch space that never hold a compilation database.
+default_prune = [
+    ".git",
+    ".hg",
+    "node_modules",
+    "buck-out/log",
+    "buck-out/tmp",
+    "buck-out/v2/log",
+    "buck-out/v2/tmp",
+    "buck-out/v2/cache",
+    "buck-out/v2/offline-cache",
+    "buck-out/v2/re_logs",
+]
+
+
+# returns a function telling whether a directory (given its path and name)
+# should be skipped
+def compile_prune(patterns):
+    name_patterns = []
+    path_patterns = []
+    for pattern in patterns:
+        pattern = pattern.strip("/")
+        if "/" in pattern:
+            path_patterns.append("(?:.*/)?" + fnmatch.translate(pattern))
+        elif pattern:
+            name_patterns.append(fnmatch.translate(pattern))
+
+    name_regex = re.compile("|".join(name_patterns)) if name_patterns else None
+    path_regex = re.compile("|".join(path_patterns)) if path_patterns else None
+
+    def pruned(path, name):
+        if name_regex != None and name_regex.match(name):
+            return True
+        return path_regex != None and bool(
+            path_regex.match(path.replace(os.sep, "/"))
+        )
+
+    return pruned
+
+
+# returns one directory's (subdirectories to crawl, databases found)
+def scan_directory(directory, pruned):
+    subdirectories = []
+    databases = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # like os.walk, symlinked directories aren't followed
+                if entry.is_dir(follow_symlinks=False):
+                    if not pruned(entry.path, entry.name):
+                        subdirectories.append(entry.path)
+                elif entry.name == "compile_commands.json" and entry.is_file():
+                    databases.append(entry.path)
+    except OSError:
+        pass
+
+    return subdirectories, databases
+
+
+# finds every compile_commands.json under root, scanning directories on a
+# thread pool (scandir spends its time waiting on the filesystem, not holding
+# the GIL).  sorted, so the merge order doesn't depend on thread timing.
+def crawl_databases(root, pool, pruned):
+    databases = []
+    pending = {pool.submit(scan_directory, root, pruned)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            subdirectories, found = future.result()
+            databases.extend(found)
+            for directory in subdirectories:
+                pending.add(pool.submit(scan_directory, directory, pruned))
+
+    return sorted(databases)
+
+
+def find_inputs(sources, paths, jobs=default_jobs, prune=default_prune):
+    inputs = list(sources)
+    if paths:
+        pruned = compile_prune(prune)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for input_path in paths:
+                inputs.extend(crawl_databases(input_path, pool, pruned))
+    return inputs
+
+
+# the entries of a database in either the standard or the table format
+def load_database(input_path):
+    with open(input_path, "r") as input_file:
+        database = json.load(input_file)
+    if is_table(database):
+        return expand_table(database)
+    return database
+
+
+# like iter_compile_commands, but also accepts tables (which have to be loaded
+# whole to be expanded)
+def read_compile_commands(input_path):
+    with open(input_path, "r") as input_file:
+        start = input_file.read(64).lstrip()
+    if start.startswith("{"):
+        yield from load_database(input_path)
+    else:
+        yield from iter_compile_commands(input_path)
+
+
+# the parsed databases, in input order - decoded across a process pool when
+# there's more than one, since json decoding is cpu bound
+def load_databases(inputs, jobs=default_jobs):
+    if jobs <= 1 or len(inputs) <= 1:
+        yield from map(load_database, inputs)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(inputs))) as pool:
+        yield from pool.map(load_database, inputs)
+
+
+# yields the entries of a compile_commands.json one at a time, only holding a
+# chunk of the file (plus the entry being decoded) in memory.
+def iter_compile_commands(input_path, chunk_size=stream_chunk_size):
+    decoder = json.JSONDecoder()
+    with open(input_path, "r") as input_file:
+        buffer = ""
+        pos = 0
+        eof = False
+        expected = "["
+
+        while True:
+            # skip to the next token, reading more of the file as needed
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer = input_file.read(chunk_size)
+                pos = 0
+                eof = not buffer
+
+            if pos == len(buffer):
+                raise ValueError(f"{input_path}: unexpected end of file")
+
+            token = buffer[pos]
+            if expected == "[":
+                if token != "[":
+                    raise ValueError(f"{input_path}: expected a list of entries")
+                pos += 1
+                expected = "entry or ]"
+            elif token == "]" and expected != "entry":
+                return
+            elif token == "," and expected == ", or ]":
+                pos += 1
+                expected = "entry"
+            elif expected != ", or ]":
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    # most likely the entry runs past the end of the buffer
+                    if eof:
+                        raise
+                    more = input_file.read(chunk_size)
+                    eof = not more
+                    buffer = buffer[pos:] + more
+                    pos = 0
+                    continue
+                yield entry
+                pos = end
+                expected = ", or ]"
+            else:
+                raise ValueError(f"{input_path}: expected {expected} at {token!r}")
+
+
+# a fixed size digest of an entry's (directory, file) key, so the dedupe index
+# doesn't hold on to the path strings themselves
+def entry_key(entry):
+    key = entry["directory"] + "\0" + entry["file"]
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+
+
+# post-process the compile commands to skip the external flags
+# because nobody really honors those
+def fix_external_argument(argument):
+    return argument.replace("/external:I", "/I")
+
+
+def fix_external_includes(entry):
+    args = entry.get("arguments", [])
+    for i in range(len(args)):
+        args[i] = fix_external_argument(args[i])
+
+
+def with_external_includes_fixed(entries):
+    for entry in entries:
+        fix_external_includes(entry)
+        yield entry
+
+
+# the table format stores every distinct string once.  arguments are split into
+# the ones naming the entry's own file (the source, its object file, its
+# dependency file, ...), kept per entry with their positions, and the rest -
+# usually identical for every file of a target - which are interned as a shared
+# flag set.  the layout is:
+#
+#   {"format": "compile_commands.table", "version": 1,
+#    "entries": [[directory string, file, flag set or -1, [[position, string], ...], {other keys}?], ...],
+#    "strings": [...],
+#    "flag_sets": [[string, ...], ...]}
+#
+# with the entries written first, so they can be streamed out as they're
+# merged.  expand_table turns it back into the standard list of entries.
+table_format = "compile_commands.table"
+table_version = 1
+
+
+def is_table(database):
+    return isinstance(database, dict) and database.get("format") == table_format
+
+
+def write_table(output_file, entries):
+    strings = {}
+    flag_sets = {}
+
+    def intern(table, value):
+        index = table.get(value)
+        if index == None:
+            index = len(table)
+            table[value] = index
+        return index
+
+    written = 0
+    output_file.write(
+        f'{{"format":"{table_format}","version":{table_version},\n"entries":['
+    )
+    for entry in entries:
+        extras = {
+            k: v
+            for k, v in entry.items()
+            if k not in ("directory", "file", "arguments")
+        }
+        flag_set = -1
+        specific = []
+        if "arguments" in entry:
+            name = os.path.basename(entry["file"])
+            markers = (name, os.path.splitext(name)[0] + ".")
+            shared = []
+            for position, argument in enumerate(entry["arguments"]):
+                if any(m in argument for m in markers):
+                    specific.append([position, intern(strings, argument)])
+                else:
+                    shared.append(intern(strings, argument))
+            flag_set = intern(flag_sets, tuple(shared))
+
+        row = [intern(strings, entry["directory"]), entry["file"], flag_set, specific]
+        if extras:
+            row.append(extras)
+        output_file.write(",\n" if written else "\n")
+        output_file.write(json.dumps(row, separators=(",", ":")))
+        written += 1
+
+    # the /external:I rewrite, once per distinct string rather than once per
+    # argument of every entry
+    output_file.write('],\n"strings":')
+    json.dump([fix_external_argument(s) for s in strings], output_file)
+    output_file.write(',\n"flag_sets":[')
+    for i, flag_set in enumerate(flag_sets):
+        output_file.write(",\n" if i else "\n")
+        output_file.write(json.dumps(flag_set, separators=(",", ":")))
+    output_file.write("]}\n")
+
+    return written
+
+
+def expand_table(table):
+    if table.get("version") != table_version:
+        raise ValueError(f"unsupported compile_commands table version {table.get('version')}")
+
+    strings = table["strings"]
+    flag_sets = [[strings[i] for i in flag_set] for flag_set in table["flag_sets"]]
+
+    entries = []
+    for row in table["entries"]:
+        entry = {"directory": strings[row[0]], "file": row[1]}
+        if row[2] >= 0:
+            arguments = list(flag_sets[row[2]])
+            for position, string in row[3]:
+                arguments.insert(position, strings[string])
+            entry["arguments"] = arguments
+        if len(row) > 4:
+            entry.update(row[4])
+        entries.append(entry)
+
+    return entries
+
+
+def expand_database(input_path, output, compact=False):
+    with open(output, "w", newline="\n") as output_file:
+        count = write_entries(output_file, load_database(input_path), compact)
+    print(f"expanded database with {count} artifacts")
+
+
+def format_entry(entry, compact):
+    if compact:
+        return json.dumps(entry, separators=(",", ":"))
+    # the same layout json.dump(..., indent=2) gives a list element
+    return "  " + json.dumps(entry, indent=2).replace("\n", "\n  ")
+
+
+# writes the entries as a json list, one entry per line when compact, or laid
+# out like json.dump(..., indent=2) otherwise.  the byte range of each entry is
+# recorded in offsets (if given) by its lookup_hash - json.dumps only emits
+# ascii, so string lengths are byte lengths.
+def write_entries(output_file, entries, compact, offsets=None):
+    written = 0
+    position = 1
+    output_file.write("[")
+    for entry in entries:
+        separator = ",\n" if written else "\n"
+        text = format_entry(entry, compact)
+        output_file.write(separator)
+        output_file.write(text)
+        position += len(separator)
+        if offsets != None:
+            offsets[lookup_hash(entry_path(entry))] = (position, len(text))
+        position += len(text)
+        written += 1
+    output_file.write("\n]" if written else "]")
+
+    return written
+
+
+# compile_commands.json lookups by file go through a sidecar written next to the
+# database: a header, then an open addressing hash table of (path hash, byte
+# offset, byte length) slots pointing into the json.  the header records the
+# database's mtime and size so a database edited by something else is noticed.
+lookup_magic = b"CCLOOKUP"
+lookup_version = 1
+lookup_header = struct.Struct("<8sIIQQ")
+lookup_slot = struct.Struct("<QQQ")
+
+
+def get_lookup_file(database):
+    return database + ".lookup"
+
+
+def entry_path(entry):
+    return os.path.normcase(
+        os.path.normpath(os.path.join(entry["directory"], entry["file"]))
+    )
+
+
+# never 0, which marks an empty slot
+def lookup_hash(path):
+    digest = hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def write_lookup(database, offsets):
+    slots = 1
+    while slots < len(offsets) * 2:
+        slots *= 2
+
+    table = bytearray(lookup_header.size + slots * lookup_slot.size)
+    st = os.stat(database)
+    lookup_header.pack_into(
+        table, 0, lookup_magic, lookup_version, slots, st.st_mtime_ns, st.st_size
+    )
+    for path_hash, (offset, length) in offsets.items():
+        slot = path_hash & (slots - 1)
+        while lookup_slot.unpack_from(table, lookup_header.size + slot * lookup_slot.size)[0]:
+            slot = (slot + 1) & (slots - 1)
+        lookup_slot.pack_into(
+            table,
+            lookup_header.size + slot * lookup_slot.size,
+            path_hash,
+            offset,
+            length,
+        )
+
+    lookup_file = get_lookup_file(database)
+    fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(lookup_file), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(table)
+    os.replace(tmp_name, lookup_file)
+
+
+# a memory mapped database and its lookup table.  only the slots probed and
+# the entry found are ever read.
+class CompileCommandLookup:
+    def __init__(self, database):
+        self._path = database
+        self._database = None
+        self._table = None
+        try:
+            with open(get_lookup_file(database), "rb") as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(database, "rb") as f:
+                st = os.fstat(f.fileno())
+                contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        if len(table) >= lookup_header.size:
+            magic, version, slots, mtime_ns, size = lookup_header.unpack_from(table)
+            if (
+                magic == lookup_magic
+                and version == lookup_version
+                and (mtime_ns, size) == (st.st_mtime_ns, st.st_size)
+                and len(table) == lookup_header.size + slots * lookup_slot.size
+            ):
+                self._table = table
+                self._slots = slots
+                self._stamp = (mtime_ns, size)
+                self._database = contents
+
+    # false once the database has been rewritten since we mapped it
+    def valid(self):
+        if self._table == None:
+            return False
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == self._stamp
+
+    def find(self, path):
+        path = os.path.normcase(os.path.normpath(os.path.abspath(path)))
+        path_hash = lookup_hash(path)
+        slot = path_hash & (self._slots - 1)
+        while True:
+            stored, offset, length = lookup_slot.unpack_from(
+                self._table, lookup_header.size + slot * lookup_slot.size
+            )
+            if stored == 0:
+                return None
+            if stored == path_hash:
+                entry = json.loads(self._database[offset : offset + length])
+                if entry_path(entry) == path:
+                    return entry
+            slot = (slot + 1) & (self._slots - 1)
+
+
+def default_database():
+    return os.path.join(common_tools.get_buck_root(), ".vscode/compile_commands.json")
+
+
+def lookup_compile_command(path, database=None):
+    """Return the compile_commands.json entry for path, or None.
+
+    Uses the database's lookup sidecar when it is up to date, and falls back
+    to reading through the whole database otherwise.
+    """
+    if database == None:
+        database = default_database()
+
+    if not hasattr(lookup_compile_command, "lookups"):
+        lookup_compile_command.lookups = {}
+    lookup = lookup_compile_command.lookups.get(database)
+    if lookup == None or not lookup.valid():
+        lookup = CompileCommandLookup(database)
+        lookup_compile_command.lookups[database] = lookup
+
+    if lookup.valid():
+        return lookup.find(path)
+
+    path = os.path.normcase(os.path.normpath(os.path.abspath(path)))
+    found = None
+    for entry in read_compile_commands(database):
+        if entry_path(entry) == path:
+            found = entry
+    return found
+
+
+# merges without ever holding a whole database in memory: a first pass over the
+# inputs records which occurrence of each (directory, file) is the last one, and
+# a second pass yields exactly those entries as they are read.  the result has
+# the same entries as the in-memory merge, but a duplicated entry is written
+# where its last occurrence is rather than its first.
+def iter_merged(inputs):
+    last_seen = {}
+    ordinal = 0
+    for input_path in inputs:
+        for entry in read_compile_commands(input_path):
+            last_seen[entry_key(entry)] = ordinal
+            ordinal += 1
+
+    ordinal = 0
+    for input_path in inputs:
+        for entry in read_compile_commands(input_path):
+            if last_seen[entry_key(entry)] == ordinal:
+                yield entry
+            ordinal += 1
+
+
+def merge_compilation_commands(
+    sources,
+    paths,
+    output,
+    streaming=False,
+    compact=False,
+    jobs=default_jobs,
+    prune=default_prune,
+    table=False,
+):
+    inputs = find_inputs(sources, paths, jobs, prune)
+    output_path = os.path.join(os.getcwd(), output)
+
+    if streaming:
+        entries = iter_merged(inputs)
+    else:
+        compile_commands = {}
+        for compile_set in load_databases(inputs, jobs):
             for item in compile_set:
                 key = (item["directory"], item["file"])
                 compile_commands[key] = item
+        entries = compile_commands.values()
 
-    for input_path in sources:
-        import_file(input_path)
-
-    for input_path in paths:
-        for root, _, files in os.walk(input_path):
-            for filename in files:
-                if filename == "compile_commands.json":
-                    import_file(os.path.join(root, filename))
-
-    # post-process the compile commands to skip the external flags
-    # because nobody really honors those
-    for entry in compile_commands.values():
-        args = entry["arguments"]
-        for i in range(len(args)):
-            args[i] = args[i].replace("/external:I", "/I")
-
-    with open(os.path.join(os.getcwd(), output), "w") as output_file:
-        json.dump(
-            list(compile_commands.values()), output_file, sort_keys=False, indent=2
-        )
+    # the output may be one of the inputs, which are read lazily when streaming -
+    # write next to it and only replace it once everything has been read
+    tmp_name = None
+    try:
+        # no newline translation, so the offsets in the lookup table hold on windows
+        with tempfile.NamedTemporaryFile(
+            mode="w",
+            dir=os.path.dirname(output_path),
+            suffix=".tmp",
+            newline="\n",
+            delete=False,
+        ) as output_file:
+            tmp_name = output_file.name
+            # temporary files are private - give it the mode open() would have
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_name, 0o666 & ~umask)
+            if table:
+                # tables have no byte offsets to look entries up by - lookups fall
+                # back to expanding the table
+                count = write_table(output_file, entries)
+            else:
+                offsets = {}
+                count = write_entries(
+                    output_file, with_external_includes_fixed(entries), compact, offsets
+                )
+        if not table:
+            # a rename keeps the mtime and size the lookup was stamped with
+            write_lookup(tmp_name, offsets)
+        os.replace(tmp_name, output_path)
+        if not table:
+            os.replace(get_lookup_file(tmp_name), get_lookup_file(output_path))
+        tmp_name = None
+    finally:
+        if tmp_name != None:
+            for path in (tmp_name, get_lookup_file(tmp_name)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
 
-    print(f"generated database with {len(compile_commands)} artifacts")
+    print(f"generated database with {count} artifacts")
 
 
 # for calling the script directly...
@@ -58,7 +605,54 @@ if __name__ == "__main__":
         type=str,
         default=os.path.join(common_tools.get_buck_root(), "compile_commands.json"),
     )
+    parser.add_argument(
+        "--streaming",
+        help="merge entry by entry instead of loading every database into memory",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--compact",
+        help="write the database without indentation",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help="threads crawling --sourcepath, and processes parsing databases",
+        type=int,
+        default=default_jobs,
+    )
+    parser.add_argument(
+        "--prune",
+        help="directory names (or path suffixes, with a slash) to skip while crawling --sourcepath; pass with no patterns to crawl everything",
+        nargs="*",
+        default=default_prune,
+    )
+    parser.add_argument(
+        "--table",
+        help="write the deduplicated argument table format instead of a standard database",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--expand",
+        help="expand a database written with --table back into a standard database at --output",
+        type=str,
+        default=None,
+    )
     args = parser.parse_args()
     print(args)
 
-    merge_compilation_commands(args.sources, args.sourcepath, args.output)
+    if args.expand != None:
+        expand_database(args.expand, args.output, args.compact)
+        sys.exit(0)
+
+    merge_compilation_commands(
+        args.sources,
+        args.sourcepath,
+        args.output,
+        args.streaming,
+        args.compact,
+        args.jobs,
+        args.prune,
+        args.table,
+    )
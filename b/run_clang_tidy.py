@@ -10,22 +10,26 @@ import platform
 import subprocess
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from time import perf_counter
 
 import ignore
 import queries
-from b import buck_query
+from b import buck_query_many
 from common_tools import (
     change_cwd,
     emphasis_color,
     enable_console_colors,
     error_color,
     exec_lines,
+    FileIndex,
     filter_extensions,
     get_buck_root,
     pretty_targets,
     success_color,
 )
+from tidy_cache import TidyCache
 from update_compilation_database import update_compilation_database
 
 tidy_extensions = [".cpp", ".h", ".cc", ".c"]
@@ -35,53 +39,42 @@ if platform.system() == "Linux":
 else:
     default_buck_mode = "@arvr/mode/win/clang/debug"
 
+default_jobs = os.cpu_count() or 1
 
-def find_file_targets(files, buck_mode):
+# how many of the slowest files to list after a parallel run
+timing_table_rows = 20
+
+
+# the cxx targets owning the given files (or None if none of the files can be
+# tidied), as a query expression - it isn't run here, so the targets and their
+# inputs can be fetched together later.
+def find_file_targets(files):
     path_files = []
     for f in files:
         for m in glob.glob(f):
             path_files.append(os.path.join(os.getcwd(), m))
 
-    filtered_files = filter_extensions(path_files, tidy_extensions)
-    if len(filtered_files) == 0:
+    # overlapping globs (or paths through symlinks) only count each file once
+    specified_files = FileIndex(filter_extensions(path_files, tidy_extensions))
+    if len(specified_files) == 0:
         print(error_color("no files with valid extensions found"))
         sys.exit(1)
 
-    # query buck for our files to see the closure of interesting targets:
-    query_string = "kind('cxx_binary|cxx_library|cxx_test', owner('%s')) - kind('prebuilt_cxx_library', owner('%s'))"
-    targets = buck_query([buck_mode], query_string, filtered_files, quiet=True)
-
-    # if we can't find any relevant targets, we can be done:
-    if len(targets) == 0:
-        target_query = ""
-    else:
-        target_query = "set('{0}')".format("' '".join(targets))
+    owners = " + ".join(f"owner('{f}')" for f in specified_files)
+    target_query = f"kind('cxx_binary|cxx_library|cxx_test', {owners}) - kind('prebuilt_cxx_library', {owners})"
 
-    return (filtered_files, target_query)
+    return (specified_files, target_query)
 
 
+# specified_files is the FileIndex from find_file_targets (or None for all
+# files) - excluded files are those not in it, or ignored.
 def build_file_list(target_files, specified_files):
-    # excluded if it's in the exclusion list, or if it's not the specified single_file
-    def file_list_contains(list, file):
-        for f in list:
-            if os.path.samefile(f, file):
-                return True
-        return False
-
-    def is_excluded_file(file):
-        if specified_files != None and not file_list_contains(specified_files, file):
-            return True
-        else:
-            ig = ignore.check(file)
-            return ig
-
-    files = []
-    for f in target_files:
-        full_path = os.path.join(get_buck_root(), f)
-        if not is_excluded_file(full_path):
-            files.append(full_path)
+    buck_root = get_buck_root()
+    files = [os.path.join(buck_root, f) for f in target_files]
+    if specified_files != None:
+        files = specified_files.filter(files)
 
-    return files
+    return [f for f in files if not ignore.check(f)]
 
 
 def find_diff_files():
@@ -98,7 +91,156 @@ def find_diff_files():
     )
 
 
-def invoke_tidy(db_dir, files, fix, fix_errors, errors_only, use_runner, export_fixes):
+# clang-tidy's stderr is just noise about the compilation database on linux.
+# elsewhere a single run leaves it on the terminal, while parallel workers
+# capture it along with their output so it's printed with the file it's about
+def tidy_stderr(captured=False):
+    if platform.system() == "Linux":
+        return subprocess.DEVNULL
+    elif captured:
+        return subprocess.STDOUT
+    else:
+        return None
+
+
+# run clang-tidy over a single file, returning (exit code, output, wall time)
+def tidy_file(clang_tidy_cmd, file, export_fixes=None):
+    cmd = list(clang_tidy_cmd)
+    if export_fixes != None:
+        cmd.append(f"--export-fixes={export_fixes}")
+    cmd.append(file)
+
+    start = perf_counter()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=tidy_stderr(captured=True))
+    elapsed = perf_counter() - start
+
+    return result.returncode, result.stdout.decode("utf-8", "replace"), elapsed
+
+
+# merge the --export-fixes files written by each clang-tidy process into one,
+# the same way run-clang-tidy.py does, but without needing pyyaml: the entries
+# of every top level Diagnostics list are concatenated under a single document.
+def merge_export_fixes(fix_files, output):
+    diagnostics = []
+    for fix_file in fix_files:
+        with open(fix_file, "r") as f:
+            in_diagnostics = False
+            for line in f:
+                if line.startswith("Diagnostics:"):
+                    in_diagnostics = True
+                elif in_diagnostics:
+                    if line.startswith("...") or (line.strip() and not line[0].isspace()):
+                        in_diagnostics = False
+                    else:
+                        diagnostics.append(line)
+
+    with open(output, "w") as f:
+        if diagnostics:
+            f.write("---\nMainSourceFile:  ''\nDiagnostics:\n")
+            f.writelines(diagnostics)
+            f.write("...\n")
+
+
+def print_timing_table(timings):
+    print(emphasis_color(f"slowest files ({len(timings)} tidied):"))
+    for elapsed, file in sorted(timings, reverse=True)[:timing_table_rows]:
+        print(f"  {elapsed:8.2f}s  {file}")
+
+
+# run one clang-tidy process per file, up to jobs at a time, printing each
+# file's diagnostics as soon as it finishes.  files whose cache key matches a
+# previous clean run are not tidied again - their output is replayed instead.
+def invoke_tidy_parallel(clang_tidy_cmd, files, jobs, export_fixes, tidy_cache=None):
+    failures = 0
+    cached = 0
+    timings = []
+    start = perf_counter()
+    with tempfile.TemporaryDirectory() as fixes_directory:
+
+        def fixes_path(i):
+            return os.path.join(fixes_directory, f"{i}.yaml")
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {}
+            done = 0
+            for i, f in enumerate(files):
+                key = tidy_cache.key(f) if tidy_cache != None else None
+                hit = tidy_cache.load(key) if key != None else None
+                # a run without --export-fixes stored no fixes, so it can't
+                # stand in for one with it
+                if hit != None and export_fixes != None and hit[1] == None:
+                    hit = None
+                if hit != None:
+                    output, fixes = hit
+                    if export_fixes != None and fixes:
+                        with open(fixes_path(i), "w") as fixes_file:
+                            fixes_file.write(fixes)
+                    cached += 1
+                    done += 1
+                    print(f"[{done}/{len(files)}] {success_color('cached')} {f}")
+                    if output.strip():
+                        print(output.rstrip())
+                    continue
+
+                fixes_file = fixes_path(i) if export_fixes != None else None
+                futures[pool.submit(tidy_file, clang_tidy_cmd, f, fixes_file)] = (
+                    i,
+                    f,
+                    key,
+                )
+
+            for future in as_completed(futures):
+                i, f, key = futures[future]
+                returncode, output, elapsed = future.result()
+                timings.append((elapsed, f))
+                done += 1
+                if returncode == 0:
+                    status = success_color("ok")
+                    # only clean runs are cached, so failures are always retried
+                    if key != None:
+                        fixes = None
+                        if export_fixes != None:
+                            # "" rather than None: fixes were asked for, there were none
+                            fixes = ""
+                            if os.path.isfile(fixes_path(i)):
+                                with open(fixes_path(i), "r") as fixes_file:
+                                    fixes = fixes_file.read()
+                        tidy_cache.store(key, output, fixes)
+                else:
+                    status = error_color("failed")
+                    failures += 1
+                print(f"[{done}/{len(files)}] {status} {f} ({elapsed:.2f}s)")
+                if output.strip():
+                    print(output.rstrip())
+
+        if export_fixes != None:
+            # keep the fixes in the same order as the input files
+            fix_files = [fixes_path(i) for i in range(len(files))]
+            merge_export_fixes(
+                [f for f in fix_files if os.path.isfile(f)], export_fixes
+            )
+
+    if timings:
+        print_timing_table(timings)
+    print(
+        emphasis_color(
+            f"tidied {len(timings)} files ({cached} cached) in {perf_counter() - start:.2f}s with {jobs} workers"
+        )
+    )
+    return 1 if failures else 0
+
+
+def invoke_tidy(
+    db_dir,
+    files,
+    fix,
+    fix_errors,
+    errors_only,
+    use_runner,
+    export_fixes,
+    jobs=default_jobs,
+    use_cache=True,
+):
     # TODO - we don't have the runner enabled by default because phabricator doesn't have
     # pyyaml installed by default, and on windows the runner regex processing doesn't escape paths.
     if platform.system() == "Linux":
@@ -145,21 +287,29 @@ def invoke_tidy(db_dir, files, fix, fix_errors, errors_only, use_runner, export_
         clang_tidy_cmd.append("-fix-errors")
     if errors_only:
         clang_tidy_cmd.append("--checks=-*,google-build-namespaces")
-    if export_fixes != None:
-        clang_tidy_cmd.append(f"--export-fixes={export_fixes}")
+
+    # in-place fixes from concurrent processes would race on shared headers, and
+    # rewrite the very files the cache is keyed on
+    if fix or fix_errors:
+        jobs = 1
+        use_cache = False
 
     print(emphasis_color("invoking clang-tidy"))
     print(clang_tidy_cmd)
     for f in pretty_targets(files):
         print("  " + f)
-    clang_tidy_cmd.extend(files)
 
-    if platform.system() == "Linux":
-        result = subprocess.call(clang_tidy_cmd, stderr=subprocess.DEVNULL)
-    else:
-        result = subprocess.call(clang_tidy_cmd)
+    if not use_runner and (jobs > 1 or use_cache):
+        tidy_cache = TidyCache(clang_tidy_cmd, db_dir) if use_cache else None
+        return invoke_tidy_parallel(
+            clang_tidy_cmd, files, jobs, export_fixes, tidy_cache
+        )
+
+    if export_fixes != None:
+        clang_tidy_cmd.append(f"--export-fixes={export_fixes}")
+    clang_tidy_cmd.extend(files)
 
-    return result
+    return subprocess.call(clang_tidy_cmd, stderr=tidy_stderr())
 
 
 def run_clang_tidy(
@@ -173,6 +323,8 @@ def run_clang_tidy(
     files=None,
     export_fixes=None,
     diff_only=False,
+    jobs=default_jobs,
+    use_cache=True,
 ):
     enable_console_colors()
 
@@ -184,24 +336,22 @@ def run_clang_tidy(
         # if we're processing a specific file set, adjust our query to find those targets
         if files != None:
             print(emphasis_color("finding targets for requested files"))
-
-            specified_files, target_query = find_file_targets(files, buck_mode)
-            if len(specified_files) == 0:
-                print(
-                    error_color(
-                        f"unable to find any targets for files {filtered_files}"
-                    )
-                )
-                sys.exit(1)
-
-            if len(target_query) == 0:
-                print(emphasis_color("no relevant targets found."))
-                sys.exit(0)
-
+            specified_files, target_query = find_file_targets(files)
         else:
             print(emphasis_color(f"tidying all buildable files from {os.getcwd()}"))
             specified_files = None
 
+        # the targets and all their inputs, in one round trip to buck
+        print(emphasis_color("querying targets and their inputs"))
+        inputs_query = f"inputs({target_query})"
+        results = buck_query_many([buck_mode], "%s", [target_query, inputs_query])
+        targets = results[target_query]
+        target_files = results[inputs_query]
+
+        if len(targets) == 0:
+            print(emphasis_color("no relevant targets found."))
+            sys.exit(0)
+
         # we need a temporary directory here because clang-tidy will search a directory, not a path for a compile_commands.json file.
         with tempfile.TemporaryDirectory() as database_directory:
             print(emphasis_color("generating compilation database"))
@@ -209,13 +359,14 @@ def run_clang_tidy(
 
             # emit compile commands database for the current path into a temp file
             update_compilation_database(
-                compile_commands, buck_mode, os.getcwd(), target_query, overwrite=True
+                compile_commands,
+                buck_mode,
+                os.getcwd(),
+                target_query,
+                overwrite=True,
+                targets=targets,
             )
 
-            print(emphasis_color("querying all target inputs"))
-            # emit query for all the input files for the targets we generated above:
-            target_files = buck_query([buck_mode], f"inputs({target_query})")
-
             # filter the target files,
             tidy_files = build_file_list(target_files, specified_files)
 
@@ -231,12 +382,16 @@ def run_clang_tidy(
                 errors_only,
                 use_runner,
                 export_fixes,
+                jobs,
+                use_cache,
             )
             if result == 0:
                 print(success_color("success - completed with no errors!"))
             else:
                 print(error_color("error: exiting with errors"))
 
+            return result
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="apply clang format to folder")
@@ -308,6 +463,20 @@ if __name__ == "__main__":
         const=True,
     )
 
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="number of clang-tidy processes to run at once (ignored with --use-runner, --fix and --fix-errors)",
+        default=default_jobs,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="re-tidy every file instead of replaying cached results for unchanged ones",
+        action="store_const",
+        const=True,
+    )
+
     args = parser.parse_args()
 
     while True:
@@ -322,6 +491,8 @@ if __name__ == "__main__":
             args.files,
             args.export_fixes,
             args.diff,
+            args.jobs,
+            not args.no_cache,
         )
 
         if not args.loop or result == 0:
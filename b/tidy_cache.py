@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import re
+
+import cache
+
+# bump to invalidate every cached result, e.g. when the key recipe changes
+key_version = 1
+
+config_file = ".clang-tidy"
+
+# preprocessor includes - conditionals and macros are ignored, so the header
+# set we find is a good approximation of what the compiler reads, not an exact
+# one.  system (-isystem) headers are left to the compile command.
+include_re = re.compile(rb'^[ \t]*#[ \t]*(?:include|import)[ \t]*([<"])([^>"\r\n]+)[>"]', re.M)
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# the include search path of a compile command, as (quote dirs, bracket dirs)
+def include_dirs(arguments, directory):
+    quote_dirs = []
+    bracket_dirs = []
+    i = 0
+    while i < len(arguments):
+        arg = arguments[i]
+        for flag, dirs in (("-iquote", quote_dirs), ("-I", bracket_dirs), ("/I", bracket_dirs)):
+            if arg.startswith(flag):
+                path = arg[len(flag) :]
+                if not path and i + 1 < len(arguments):
+                    i += 1
+                    path = arguments[i]
+                if path:
+                    dirs.append(os.path.normpath(os.path.join(directory, path)))
+                break
+        i += 1
+
+    return quote_dirs, quote_dirs + bracket_dirs
+
+
+class TidyCache:
+    """Content-addressed store of clang-tidy results.
+
+    A file's key covers its contents, its compile command, the .clang-tidy
+    files that apply to it, the headers it (transitively) includes from the
+    enlistment, and the clang-tidy binary and flags. Results live in the b cache
+    directory, one json file per key.
+    """
+
+    def __init__(self, clang_tidy_cmd, db_dir):
+        # the compilation database lives in a temporary directory, so -p can't
+        # be part of the key - the compile command itself is
+        tool = [a for a in clang_tidy_cmd if not a.startswith("-p=")]
+        tool_stamps = [cache.file_stamp(a) for a in tool if os.path.isabs(a)]
+        self._tool_key = json.dumps([key_version, tool, tool_stamps])
+
+        self._commands = {}
+        with open(os.path.join(db_dir, "compile_commands.json"), "r") as f:
+            for entry in json.load(f):
+                path = os.path.normpath(os.path.join(entry["directory"], entry["file"]))
+                self._commands[path] = entry
+
+        self._hashes = {}
+        self._includes = {}
+        self._resolved = {}
+        self._configs = {}
+
+    def _hash_file(self, path):
+        if path not in self._hashes:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data == None:
+                self._hashes[path] = None
+            else:
+                self._hashes[path] = hash_bytes(data)
+                self._includes[path] = include_re.findall(data)
+
+        return self._hashes[path]
+
+    def _resolve(self, name, kind, from_dir, quote_dirs, search_dirs):
+        memo_key = (name, from_dir if kind == b'"' else None, search_dirs)
+        if memo_key not in self._resolved:
+            dirs = ([from_dir] + list(quote_dirs) if kind == b'"' else []) + list(search_dirs)
+            found = None
+            for d in dirs:
+                candidate = os.path.normpath(os.path.join(d, name))
+                if os.path.isfile(candidate):
+                    found = candidate
+                    break
+            self._resolved[memo_key] = found
+
+        return self._resolved[memo_key]
+
+    def _header_hashes(self, path, arguments, directory):
+        quote_dirs, search_dirs = include_dirs(arguments, directory)
+        quote_dirs = tuple(quote_dirs)
+        search_dirs = tuple(search_dirs)
+
+        seen = {path}
+        pending = [path]
+        headers = []
+        while pending:
+            current = pending.pop()
+            self._hash_file(current)
+            for kind, name in self._includes.get(current, []):
+                header = self._resolve(
+                    name.decode("utf-8", "replace"),
+                    kind,
+                    os.path.dirname(current),
+                    quote_dirs,
+                    search_dirs,
+                )
+                if header and header not in seen:
+                    seen.add(header)
+                    pending.append(header)
+                    headers.append(header)
+
+        return sorted((h, self._hash_file(h)) for h in headers)
+
+    def _config_hash(self, directory):
+        if directory not in self._configs:
+            parent = os.path.dirname(directory)
+            inherited = self._config_hash(parent) if parent != directory else ""
+            own = self._hash_file(os.path.join(directory, config_file)) or ""
+            self._configs[directory] = hash_bytes((inherited + own).encode("utf-8"))
+
+        return self._configs[directory]
+
+    def key(self, file):
+        """Return the cache key for file, or None if it can't be cached."""
+        path = os.path.normpath(os.path.abspath(file))
+        entry = self._commands.get(path)
+        source_hash = self._hash_file(path)
+        if entry == None or source_hash == None:
+            return None
+
+        arguments = entry.get("arguments") or entry.get("command", "").split()
+        key_data = json.dumps(
+            [
+                self._tool_key,
+                source_hash,
+                entry.get("directory"),
+                arguments,
+                self._config_hash(os.path.dirname(path)),
+                self._header_hashes(path, arguments, entry["directory"]),
+            ]
+        )
+        return hash_bytes(key_data.encode("utf-8"))
+
+    def load(self, key):
+        """Return the cached (output, fixes) for key, or None."""
+        result = cache.read_json(os.path.join("tidy", key[:2], key + ".json"))
+        if not isinstance(result, dict):
+            return None
+        return result.get("output", ""), result.get("fixes")
+
+    def store(self, key, output, fixes=None):
+        cache.write_json(
+            os.path.join("tidy", key[:2], key + ".json"),
+            {"output": output, "fixes": fixes},
+        )
@@ -0,0 +1,90 @@
+"""Benchmark the first-pass scanners used by ``toml.loads``.
+
+Compares the character-by-character reference scanner (``_scan_chars``) with
+the search-based one ``loads`` uses (``_scan``) on synthetic documents shaped
+like buck_auto_mode.toml, and times a full ``loads`` with each.
+
+Run from the directory containing the toml package:
+
+    python3 -m toml.benchmark [--sizes 1 10] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from toml import decoder
+
+
+def synthetic_document(size):
+    """Return a TOML document of at least ``size`` bytes."""
+    chunks = []
+    total = 0
+    i = 0
+    while total < size:
+        chunk = (
+            "# project {0} - generated for benchmarking\n"
+            "[[Project]]\n"
+            "paths = [\n"
+            "    \"arvr/projects/p{0}/*\",  # main sources\n"
+            "    \"arvr/libraries/l{0}/[ab]*\",\n"
+            "]\n"
+            "build = \"buck2\"\n"
+            "owner = 'team-{0}'\n"
+            "description = \"\"\"\n"
+            "Project {0}, with a \\\"quoted\\\" name and # not a comment\n"
+            "\"\"\"\n"
+            "[Project.linux]\n"
+            "dev = [\"arvr/mode/linux/dev\", \"arvr/mode/linux/dev-{0}\"]\n"
+            "opt = \"arvr/mode/linux/opt\"\n"
+            "\n"
+        ).format(i)
+        chunks.append(chunk)
+        total += len(chunk)
+        i += 1
+    return "".join(chunks)
+
+
+def best_of(repeat, fn, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=float, nargs="+", default=[1, 10],
+        help="document sizes to test, in MB")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="runs per measurement (the best is reported)")
+    args = parser.parse_args()
+
+    original_scan = decoder._scan
+    for size in args.sizes:
+        doc = synthetic_document(int(size * 1024 * 1024))
+        if (decoder._scan_chars(doc, decoder.TomlDecoder()) !=
+                decoder._scan(doc, decoder.TomlDecoder())):
+            raise SystemExit("scanners disagree on the {}MB document".format(
+                size))
+
+        print("{}MB ({} bytes):".format(size, len(doc)))
+        for name, scan in (("chars", decoder._scan_chars),
+                           ("tokens", original_scan)):
+            scan_time = best_of(args.repeat, scan, doc, decoder.TomlDecoder())
+            decoder._scan = scan
+            try:
+                loads_time = best_of(args.repeat, decoder.loads, doc)
+            finally:
+                decoder._scan = original_scan
+            print("  {:<6} scan {:8.1f}ms   loads {:8.1f}ms".format(
+                name, scan_time * 1000, loads_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
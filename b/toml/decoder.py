@@ -162,32 +162,14 @@ def load(f, _dict=dict, decoder=None):
 _groupname_re = re.compile(r'^[A-Za-z0-9_-]+$')
 
 
-def loads(s, _dict=dict, decoder=None):
-    """Parses string as toml
-
-    Args:
-        s: String to be parsed
-        _dict: (optional) Specifies the class of the returned toml dictionary
+def _scan_chars(s, decoder):
+    """Reference implementation of the first pass of ``loads``.
 
-    Returns:
-        Parsed toml file represented as a dictionary
-
-    Raises:
-        TypeError: When a non-string is passed
-        TomlDecodeError: Error while decoding toml
+    Walks the document one character at a time, validating key names and
+    quoting, reporting comments to the decoder and returning the document
+    with comments blanked out and newlines inside arrays joined. Kept for
+    comparison against ``_scan``; see benchmark.py.
     """
-
-    implicitgroups = []
-    if decoder is None:
-        decoder = TomlDecoder(_dict)
-    retval = decoder.get_empty_table()
-    currentlevel = retval
-    if not isinstance(s, basestring):
-        raise TypeError("Expecting something like a string")
-
-    if not isinstance(s, unicode):
-        s = s.decode('utf8')
-
     original = s
     sl = list(s)
     openarr = 0
@@ -361,7 +343,315 @@ def loads(s, _dict=dict, decoder=None):
     if openstring:  # reached EOF and have an unterminated string
         raise TomlDecodeError("Unterminated string found."
                               " Reached end of file.", original, len(s))
-    s = ''.join(sl)
+    return ''.join(sl)
+
+
+# Characters that can change the state of the first pass, depending on whether
+# we are outside a string, inside a basic ("...") string or inside a literal
+# ('...') string. Everything in between can be skipped over in one search.
+_scan_special = {
+    "": re.compile(r"[\r\n'\"#\[\]]"),
+    '"': re.compile(r'[\r\n"]'),
+    "'": re.compile(r"[\r\n']"),
+}
+_scan_blank = re.compile(r"[ \t]*")
+# a plain key and its '=' - by far the most common start of a line
+_scan_bare_key = re.compile(r"([A-Za-z0-9_-]+)[ \t]*=")
+# complete single-line strings, consumed in one step when they open cleanly
+_scan_string = {
+    '"': re.compile(r'"[^"\\\r\n]*(?:\\[^\r\n][^"\\\r\n]*)*"'),
+    "'": re.compile(r"'[^'\r\n]*'"),
+}
+
+
+def _scan(s, decoder):
+    """First pass of ``loads``.
+
+    Equivalent to ``_scan_chars``, but instead of copying the document into a
+    list and visiting every character, it searches ahead for the next
+    character that can change the scanner state and jumps straight to it.
+    Only key names are still walked character by character. Modifications to
+    the document are recorded as point edits and comment spans and applied
+    once at the end.
+    """
+    original = s
+    n = len(s)
+    edits = {}
+    comments = []
+    openarr = 0
+    openstring = False
+    openstrchar = ""
+    multilinestr = False
+    arrayoftables = False
+    beginline = True
+    keygroup = False
+    dottedkey = False
+    keyname = 0
+    key = ''
+    prev_key = ''
+    line_no = 1
+
+    # the character at p as the reference scanner's edited list would have
+    # it, including its wrap-around for negative indices
+    def at(p):
+        if -n <= p < 0:
+            p += n
+        c = edits.get(p)
+        if c is not None:
+            return c
+        if comments and comments[-1][0] <= p < comments[-1][1]:
+            return ' '
+        return s[p]
+
+    i = 0
+    while True:
+        if keyname:
+            if i >= n:
+                break
+            item = s[i]
+            if item == '\r' and s[i + 1] == '\n':
+                edits[i] = ' '
+                i += 1
+                continue
+            key += item
+            if item == '\n':
+                raise TomlDecodeError("Key name found without value."
+                                      " Reached end of line.", original, i)
+            i += 1
+            if openstring:
+                if item == openstrchar:
+                    oddbackslash = False
+                    k = 2
+                    while i >= k and at(i - k) == '\\':
+                        oddbackslash = not oddbackslash
+                        k += 1
+                    if not oddbackslash:
+                        keyname = 2
+                        openstring = False
+                        openstrchar = ""
+                continue
+            elif keyname == 1:
+                if item.isspace():
+                    keyname = 2
+                    continue
+                elif item == '.':
+                    dottedkey = True
+                    continue
+                elif item.isalnum() or item == '_' or item == '-':
+                    continue
+                elif (dottedkey and at(i - 2) == '.' and
+                      (item == '"' or item == "'")):
+                    openstring = True
+                    openstrchar = item
+                    continue
+            elif keyname == 2:
+                if item.isspace():
+                    if dottedkey:
+                        nextitem = s[i]
+                        if not nextitem.isspace() and nextitem != '.':
+                            keyname = 1
+                    continue
+                if item == '.':
+                    dottedkey = True
+                    nextitem = s[i]
+                    if not nextitem.isspace() and nextitem != '.':
+                        keyname = 1
+                    continue
+            if item != '=':
+                raise TomlDecodeError("Found invalid character in key name: '" +
+                                      item + "'. Try quoting the key name.",
+                                      original, i - 1)
+            # the '=' itself has no further effect on the scanner state
+            keyname = 0
+            prev_key = key[:-1].rstrip()
+            key = ''
+            dottedkey = False
+            continue
+
+        if beginline:
+            i = _scan_blank.match(s, i).end()
+        else:
+            match = _scan_special[openstrchar].search(s, i)
+            if match is None:
+                break
+            i = match.start()
+        if i >= n:
+            break
+
+        item = s[i]
+        if (item == '"' or item == "'") and not openstring and not beginline:
+            # an opening quote that doesn't start a triple quote and isn't
+            # preceded by a quote or backslash: if the string closes on this
+            # line, the scanner state afterwards is exactly what it was before
+            prev = edits.get(i - 1) or s[i - 1]
+            if i + 1 < n and s[i + 1] != item and prev not in '"\'\\':
+                match = _scan_string[item].match(s, i)
+                if match:
+                    i = match.end()
+                    continue
+        if item == '\r':
+            if s[i + 1] == '\n':
+                edits[i] = ' '
+                i += 1
+                continue
+        elif item == "'":
+            if openstrchar != '"':
+                k = 1
+                try:
+                    while at(i - k) == "'":
+                        k += 1
+                        if k == 3:
+                            break
+                except IndexError:
+                    pass
+                if k == 3:
+                    multilinestr = not multilinestr
+                    openstring = multilinestr
+                else:
+                    openstring = not openstring
+                if openstring:
+                    openstrchar = "'"
+                else:
+                    openstrchar = ""
+        elif item == '"':
+            if openstrchar != "'":
+                oddbackslash = False
+                k = 1
+                tripquote = False
+                try:
+                    while at(i - k) == '"':
+                        k += 1
+                        if k == 3:
+                            tripquote = True
+                            break
+                    if k == 1 or (k == 3 and tripquote):
+                        while at(i - k) == '\\':
+                            oddbackslash = not oddbackslash
+                            k += 1
+                except IndexError:
+                    pass
+                if not oddbackslash:
+                    if tripquote:
+                        multilinestr = not multilinestr
+                        openstring = multilinestr
+                    else:
+                        openstring = not openstring
+                if openstring:
+                    openstrchar = '"'
+                else:
+                    openstrchar = ""
+        elif item == '#':
+            if not openstring and not keygroup and not arrayoftables:
+                j = s.find('\n', i)
+                if j < 0:
+                    comments.append((i, n))
+                    break
+                comments.append((i, j))
+                if not openarr:
+                    decoder.preserve_comment(line_no, prev_key, s[i:j],
+                                             beginline)
+                # the rest of the comment is blank, resume at the newline
+                i = j
+                continue
+        elif item == '[':
+            if not openstring and not keygroup and not arrayoftables:
+                if beginline:
+                    if n > i + 1 and s[i + 1] == '[':
+                        arrayoftables = True
+                    else:
+                        keygroup = True
+                else:
+                    openarr += 1
+        elif item == ']':
+            if not openstring:
+                if keygroup:
+                    keygroup = False
+                elif arrayoftables:
+                    if at(i - 1) == ']':
+                        arrayoftables = False
+                else:
+                    openarr -= 1
+
+        if item == '\n':
+            if openstring or multilinestr:
+                if not multilinestr:
+                    raise TomlDecodeError("Unbalanced quotes", original, i)
+                if ((at(i - 1) == "'" or at(i - 1) == '"') and (
+                        at(i - 2) == at(i - 1))):
+                    edits[i] = at(i - 1)
+                    if at(i - 3) == at(i - 1):
+                        edits[(i - 3) % n] = ' '
+            elif openarr:
+                edits[i] = ' '
+            else:
+                beginline = True
+            line_no += 1
+        elif beginline and item != ' ' and item != '\t':
+            beginline = False
+            if not keygroup and not arrayoftables:
+                if item == '=':
+                    raise TomlDecodeError("Found empty keyname. ", original, i)
+                match = _scan_bare_key.match(s, i)
+                if match:
+                    # a plain key followed by its '=': skip the per-character
+                    # walk, it would end in exactly this state
+                    prev_key = match.group(1)
+                    i = match.end()
+                    continue
+                keyname = 1
+                key += item
+        i += 1
+    if keyname:
+        raise TomlDecodeError("Key name found without value."
+                              " Reached end of file.", original, len(s))
+    if openstring:  # reached EOF and have an unterminated string
+        raise TomlDecodeError("Unterminated string found."
+                              " Reached end of file.", original, len(s))
+
+    # apply the edits in document order
+    spans = [(p, p + 1, c) for p, c in edits.items()]
+    spans.extend((start, end, ' ' * (end - start)) for start, end in comments)
+    spans.sort()
+    pieces = []
+    pos = 0
+    for start, end, replacement in spans:
+        if start < pos:
+            continue
+        pieces.append(s[pos:start])
+        pieces.append(replacement)
+        pos = end
+    pieces.append(s[pos:])
+    return ''.join(pieces)
+
+
+def loads(s, _dict=dict, decoder=None):
+    """Parses string as toml
+
+    Args:
+        s: String to be parsed
+        _dict: (optional) Specifies the class of the returned toml dictionary
+
+    Returns:
+        Parsed toml file represented as a dictionary
+
+    Raises:
+        TypeError: When a non-string is passed
+        TomlDecodeError: Error while decoding toml
+    """
+
+    implicitgroups = []
+    if decoder is None:
+        decoder = TomlDecoder(_dict)
+    retval = decoder.get_empty_table()
+    currentlevel = retval
+    if not isinstance(s, basestring):
+        raise TypeError("Expecting something like a string")
+
+    if not isinstance(s, unicode):
+        s = s.decode('utf8')
+
+    original = s
+    s = _scan(s, decoder)
     s = s.split('\n')
     multikey = None
     multilinestr = ""
@@ -606,26 +896,25 @@ _escapedchars = ['\0', '\b', '\f', '\n', '\r', '\t', '\"']
 _escape_to_escapedchars = dict(zip(_escapes, _escapedchars))
 
 
+_escape_re = re.compile(r'\\(.)', re.DOTALL)
+
+
+def _unescape_match(m):
+    c = m.group(1)
+    if c in _escape_to_escapedchars:
+        return _escape_to_escapedchars[c]
+    if c == '\\':
+        return c
+    if c == 'u' or c == 'U':
+        return m.group(0)
+    raise ValueError("Reserved escape sequence used")
+
+
 def _unescape(v):
     """Unescape characters in a TOML string."""
-    i = 0
-    backslash = False
-    while i < len(v):
-        if backslash:
-            backslash = False
-            if v[i] in _escapes:
-                v = v[:i - 1] + _escape_to_escapedchars[v[i]] + v[i + 1:]
-            elif v[i] == '\\':
-                v = v[:i - 1] + v[i:]
-            elif v[i] == 'u' or v[i] == 'U':
-                i += 1
-            else:
-                raise ValueError("Reserved escape sequence used")
-            continue
-        elif v[i] == '\\':
-            backslash = True
-        i += 1
-    return v
+    if '\\' not in v:
+        return v
+    return _escape_re.sub(_unescape_match, v)
 
 
 class InlineTableDict(object):
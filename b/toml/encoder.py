@@ -9,16 +9,19 @@ if sys.version_info >= (3,):
     unicode = str
 
 
-def dump(o, f, encoder=None):
+def dump(o, f, encoder=None, streaming=False):
     """Writes out dict as toml to a file
 
     Args:
         o: Object to dump into toml
         f: File descriptor where the toml should be stored
         encoder: The ``TomlEncoder`` to use for constructing the output string
+        streaming: Write the document section by section as it is encoded
+            instead of building it in memory first
 
     Returns:
-        String containing the toml corresponding to dictionary
+        String containing the toml corresponding to dictionary, or None when
+        streaming
 
     Raises:
         TypeError: When anything other than file descriptor is passed
@@ -26,6 +29,10 @@ def dump(o, f, encoder=None):
 
     if not f.write:
         raise TypeError("You can only dump an object to a file descriptor")
+    if streaming:
+        for chunk in iterdumps(o, encoder=encoder):
+            f.write(chunk)
+        return None
     d = dumps(o, encoder=encoder)
     f.write(d)
     return d
@@ -54,33 +61,49 @@ def dumps(o, encoder=None):
         ```
     """
 
-    retval = ""
+    return "".join(iterdumps(o, encoder=encoder))
+
+
+def iterdumps(o, encoder=None):
+    """Stringifies input dict as toml, one section at a time
+
+    Args:
+        o: Object to dump into toml
+        encoder: The ``TomlEncoder`` to use for constructing the output string
+
+    Yields:
+        Consecutive chunks of the toml corresponding to dict; joined, they
+        are exactly what ``dumps`` returns
+    """
+
     if encoder is None:
         encoder = TomlEncoder(o.__class__)
     addtoretval, sections = encoder.dump_sections(o, "")
-    retval += addtoretval
-    outer_objs = [id(o)]
+    # the last two characters written so far, to decide on blank lines
+    tail = ""
+    if addtoretval:
+        yield addtoretval
+        tail = addtoretval[-2:]
+    outer_objs = set([id(o)])
     while sections:
         section_ids = [id(section) for section in sections.values()]
-        for outer_obj in outer_objs:
-            if outer_obj in section_ids:
-                raise ValueError("Circular reference detected")
-        outer_objs += section_ids
+        if not outer_objs.isdisjoint(section_ids):
+            raise ValueError("Circular reference detected")
+        outer_objs.update(section_ids)
         newsections = encoder.get_empty_table()
         for section in sections:
             addtoretval, addtosections = encoder.dump_sections(
                 sections[section], section)
 
             if addtoretval or (not addtoretval and not addtosections):
-                if retval and retval[-2:] != "\n\n":
-                    retval += "\n"
-                retval += "[" + section + "]\n"
-                if addtoretval:
-                    retval += addtoretval
+                chunk = "[" + section + "]\n" + addtoretval
+                if tail and tail != "\n\n":
+                    chunk = "\n" + chunk
+                yield chunk
+                tail = (tail + chunk)[-2:]
             for s in addtosections:
                 newsections[section + "." + s] = addtosections[s]
         sections = newsections
-    return retval
 
 
 def _dump_str(v):
@@ -148,11 +171,8 @@ class TomlEncoder(object):
         return self._dict()
 
     def dump_list(self, v):
-        retval = "["
-        for u in v:
-            retval += " " + unicode(self.dump_value(u)) + ","
-        retval += "]"
-        return retval
+        return "[" + "".join([" " + unicode(self.dump_value(u)) + ","
+                              for u in v]) + "]"
 
     def dump_inline_table(self, section):
         """Preserve inline table in its compact syntax instead of expanding
@@ -180,11 +200,13 @@ class TomlEncoder(object):
         return dump_fn(v) if dump_fn is not None else self.dump_funcs[str](v)
 
     def dump_sections(self, o, sup):
-        retstr = ""
+        # output is accumulated in lists and joined once, tables with many
+        # keys would otherwise be rebuilt for every line appended
+        retstr = []
         if sup != "" and sup[-1] != ".":
             sup += '.'
         retdict = self._dict()
-        arraystr = ""
+        arraystr = []
         for section in o:
             section = unicode(section)
             qsection = section
@@ -198,14 +220,14 @@ class TomlEncoder(object):
                             arrayoftables = True
                 if arrayoftables:
                     for a in o[section]:
-                        arraytabstr = "\n"
-                        arraystr += "[[" + sup + qsection + "]]\n"
+                        arraytabstr = ["\n"]
+                        arraystr.append("[[" + sup + qsection + "]]\n")
                         s, d = self.dump_sections(a, sup + qsection)
                         if s:
                             if s[0] == "[":
-                                arraytabstr += s
+                                arraytabstr.append(s)
                             else:
-                                arraystr += s
+                                arraystr.append(s)
                         while d:
                             newd = self._dict()
                             for dsec in d:
@@ -213,24 +235,25 @@ class TomlEncoder(object):
                                                             qsection + "." +
                                                             dsec)
                                 if s1:
-                                    arraytabstr += ("[" + sup + qsection +
-                                                    "." + dsec + "]\n")
-                                    arraytabstr += s1
+                                    arraytabstr.append("[" + sup + qsection +
+                                                       "." + dsec + "]\n")
+                                    arraytabstr.append(s1)
                                 for s1 in d1:
                                     newd[dsec + "." + s1] = d1[s1]
                             d = newd
-                        arraystr += arraytabstr
+                        arraystr.extend(arraytabstr)
                 else:
                     if o[section] is not None:
-                        retstr += (qsection + " = " +
-                                   unicode(self.dump_value(o[section])) + '\n')
+                        retstr.append(qsection + " = " +
+                                      unicode(self.dump_value(o[section])) +
+                                      '\n')
             elif self.preserve and isinstance(o[section], InlineTableDict):
-                retstr += (qsection + " = " +
-                           self.dump_inline_table(o[section]))
+                retstr.append(qsection + " = " +
+                              self.dump_inline_table(o[section]))
             else:
                 retdict[qsection] = o[section]
-        retstr += arraystr
-        return (retstr, retdict)
+        retstr.extend(arraystr)
+        return ("".join(retstr), retdict)
 
 
 class TomlPreserveInlineDictEncoder(TomlEncoder):
@@ -251,7 +274,7 @@ class TomlArraySeparatorEncoder(TomlEncoder):
 
     def dump_list(self, v):
         t = []
-        retval = "["
+        retval = ["["]
         for u in v:
             t.append(self.dump_value(u))
         while t != []:
@@ -261,10 +284,10 @@ class TomlArraySeparatorEncoder(TomlEncoder):
                     for r in u:
                         s.append(r)
                 else:
-                    retval += " " + unicode(u) + self.separator
+                    retval.append(" " + unicode(u) + self.separator)
             t = s
-        retval += "]"
-        return retval
+        retval.append("]")
+        return "".join(retval)
 
 
 class TomlNumpyEncoder(TomlEncoder):
@@ -2,35 +2,218 @@
 # (c) Meta Platforms, Inc. and affiliates. Confidential and proprietary.
 
 import argparse
+import hashlib
 import json
 import os
 import subprocess
 import sys
 
+import cache
 import queries
 from b import buck_query
+from b import buck_query_many
+from b import default_buck
 from b import default_mode
-from b import find_output
 from b import invoke_buck
 from common_tools import change_cwd
 from common_tools import get_buck_root
 from common_tools import pretty_targets
 from common_tools import temporary_filename
+from merge_compilation_commands import default_database
+from merge_compilation_commands import load_database
 from merge_compilation_commands import merge_compilation_commands
 
-buck_root = get_buck_root()
-default_output_file = os.path.join(buck_root, ".vscode/compile_commands.json")
+
+# resolved on first use rather than at import - run_clang_tidy imports us and
+# always passes its own output file.
+def get_default_output_file():
+    return default_database()
+
+
+# bump when the layout of the incremental index changes
+index_version = 2
+
+database_flavor = "#compilation-database"
+
+
+# the incremental index lives next to the database it describes
+def get_index_file(output_file):
+    return output_file + ".index"
+
+
+def load_index(output_file, mode):
+    try:
+        with open(get_index_file(output_file), "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+
+    # a different mode means different compile commands for every target, and
+    # a database rewritten since (by a full update, say) may not hold what the
+    # index says it does
+    if (
+        not isinstance(index, dict)
+        or index.get("version") != index_version
+        or index.get("mode") != mode
+        or not os.path.isfile(output_file)
+        or index.get("database") != cache.file_stamp(output_file)
+    ):
+        index = {"version": index_version, "mode": mode, "targets": {}}
+
+    return index
+
+
+# the source files and build file of every target, in one buck invocation
+def query_target_inputs(mode, targets):
+    return buck_query_many([mode], "inputs(%s) + buildfile(%s)", targets, quiet=True)
+
+
+# a fingerprint of everything we know feeds a target's compile commands.  file
+# stamps (mtime and size) stand in for contents, and changes to macros or the
+# mode files themselves aren't seen - run without --incremental after touching those.
+def target_hash(buck_root, target, inputs):
+    stamps = [
+        (path, cache.file_stamp(os.path.join(buck_root, path)))
+        for path in sorted(inputs)
+    ]
+    return hashlib.sha1(json.dumps([target, stamps]).encode("utf-8")).hexdigest()
+
+
+def entry_keys(database_file):
+    with open(database_file, "r") as f:
+        return [[entry["directory"], entry["file"]] for entry in json.load(f)]
+
+
+def build_databases(mode, targets, build):
+    with temporary_filename() as flagsfile:
+        with open(flagsfile, "w") as f:
+            for target in targets:
+                f.write(target + database_flavor + "\n")
+                if build:
+                    f.write(target + "\n")
+
+        # now, invoke buck to build the compilation databases:
+        return invoke_buck(default_buck, ["build", mode, f"@{flagsfile}"])
+
+
+# the compile_commands.json built for each target, by target
+def find_artifacts(buck_root, report):
+    artifacts = {}
+    for result in report.results():
+        if result.success:
+            output = result.output
+            if output != None and output.endswith("compile_commands.json"):
+                target = result.target
+                if target.endswith(database_flavor):
+                    target = target[: -len(database_flavor)]
+                artifacts[target] = os.path.join(buck_root, output)
+            else:
+                print(f"could not find output for: [{result.target}]")
+
+    return artifacts
+
+
+# rebuilds only the databases of targets whose inputs changed since the index
+# was written, and splices their entries into the existing output file.
+def update_incrementally(buck_root, output_file, mode, targets, build, overwrite):
+    index = load_index(output_file, mode)
+    indexed = index["targets"]
+
+    hashes = {}
+    for target, inputs in query_target_inputs(mode, targets).items():
+        hashes[target] = target_hash(buck_root, target, inputs)
+
+    changed = set(
+        t
+        for t in targets
+        if t not in hashes or indexed.get(t, {}).get("hash") != hashes[t]
+    )
+
+    # an entry can come from more than one target - rebuild everything sharing
+    # an entry with a changed target, so dropping its entries loses nothing
+    stale_keys = set()
+    for target in changed:
+        stale_keys.update(tuple(k) for k in indexed.get(target, {}).get("keys", []))
+    for target in targets:
+        keys = indexed.get(target, {}).get("keys", [])
+        if target not in changed and any(tuple(k) in stale_keys for k in keys):
+            changed.add(target)
+            stale_keys.update(tuple(k) for k in keys)
+
+    print(f"{len(changed)} of {len(targets)} targets changed")
+    if not changed and not overwrite:
+        return
+
+    artifacts = {}
+    if changed:
+        artifacts = find_artifacts(
+            buck_root, build_databases(mode, sorted(changed), build)
+        )
+
+    # keep the entries of unchanged targets (and, unless overwriting, entries
+    # we don't know the origin of), drop the rest
+    if overwrite:
+        kept_keys = set()
+        for target in targets:
+            if target not in changed:
+                kept_keys.update(tuple(k) for k in indexed[target]["keys"])
+
+        def keep(key):
+            return key in kept_keys
+
+    else:
+
+        def keep(key):
+            return key not in stale_keys
+
+    with temporary_filename(".json") as kept_file:
+        kept = []
+        if os.path.isfile(output_file):
+            kept = [
+                e
+                for e in load_database(output_file)
+                if keep((e["directory"], e["file"]))
+            ]
+        with open(kept_file, "w") as f:
+            json.dump(kept, f)
+
+        merge_compilation_commands(
+            [kept_file] + list(artifacts.values()), [], output_file
+        )
+
+    if overwrite:
+        indexed = {t: indexed[t] for t in targets if t in indexed}
+    for target in changed:
+        if target in artifacts:
+            indexed[target] = {
+                "hash": hashes.get(target),
+                "keys": entry_keys(artifacts[target]),
+            }
+        else:
+            indexed.pop(target, None)
+
+    index["targets"] = indexed
+    index["database"] = cache.file_stamp(output_file)
+    with open(get_index_file(output_file), "w") as f:
+        json.dump(index, f, separators=(",", ":"))
 
 
 def update_compilation_database(
-    output_file=default_output_file,
+    output_file=None,
     mode=default_mode,
     target_directory=os.getcwd(),
     target_query=queries.default_targets,
     build=False,
     overwrite=False,
     exclude_query=None,
+    incremental=False,
+    targets=None,
 ):
+    if output_file == None:
+        output_file = get_default_output_file()
+
+    buck_root = get_buck_root()
+
     with change_cwd(target_directory):
         # query buck for all the targets recursively
         if exclude_query != None:
@@ -38,30 +221,21 @@ def update_compilation_database(
         else:
             full_query = target_query
 
-        lines = buck_query([mode], full_query)
+        # callers that already ran the query can pass its results along
+        if targets != None:
+            lines = targets
+        else:
+            lines = buck_query([mode], full_query)
 
-        with temporary_filename() as flagsfile:
-            with open(flagsfile, "w") as f:
-                for target in lines:
-                    f.write(target + "#compilation-database\n")
-                    if build:
-                        f.write(target + "\n")
+        if incremental:
+            update_incrementally(buck_root, output_file, mode, lines, build, overwrite)
+            return
 
-            # now, invoke buck to build the compilation databases:
-            build_database = invoke_buck(["build", mode, f"@{flagsfile}"])
+        report = build_databases(mode, lines, build)
 
         # now, we have generated a bunch of compilation databases, lets merge them all
         # into the root database
-        artifacts = []
-        build_results = build_database["results"]
-        for rule, result in build_results.items():
-            if result["success"]:
-                output = find_output(result)
-                if "output" != None and output.endswith("compile_commands.json"):
-                    artifact = output
-                    artifacts.append(os.path.join(buck_root, artifact))
-                else:
-                    print(f"could not find output for: [{rule}]")
+        artifacts = list(find_artifacts(buck_root, report).values())
 
     if not overwrite and os.path.isfile(output_file):
         # go ahead and stick this at the front - later elements take precedence
@@ -71,6 +245,12 @@ def update_compilation_database(
 
     merge_compilation_commands(artifacts, [], output_file)
 
+    # the index no longer describes the database
+    try:
+        os.remove(get_index_file(output_file))
+    except OSError:
+        pass
+
 
 # for calling the script directly...
 if __name__ == "__main__":
@@ -102,8 +282,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "--output-file",
         type=str,
-        help="target path for compile commands json file",
-        default=default_output_file,
+        help="target path for compile commands json file (default: <buck root>/.vscode/compile_commands.json)",
+        default=None,
     )
     parser.add_argument(
         "--overwrite",
@@ -114,6 +294,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--exclude-query", type=str, help="query for excluded targets", default=None
     )
+    parser.add_argument(
+        "--incremental",
+        help="only rebuild the databases of targets whose inputs changed since the last incremental update, and splice them into the output file",
+        action="store_const",
+        const=True,
+    )
     args = parser.parse_args()
 
     update_compilation_database(
@@ -124,4 +310,5 @@ if __name__ == "__main__":
         args.build,
         args.overwrite,
         args.exclude_query,
+        args.incremental,
     )
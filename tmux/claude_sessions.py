@@ -2,9 +2,12 @@
 """
 Cross-session Claude agent status for tmux.
 
-Replaces constellation.py's per-tab call. Runs every 2 seconds via #(...) in
-status-right. Works entirely via side effects (sets tmux options directly),
-outputs nothing.
+Replaces constellation.py's per-tab call. Each run does one refresh.
+update_theme.sh no longer runs it from status-right; it starts
+claude_sessions_daemon.py instead, which refreshes through the same helpers
+from a resident process, over a control mode client and with an
+inotify-maintained index of the state files. Works entirely via side effects
+(sets tmux options directly), outputs nothing.
 
 Responsibilities:
 - Scan ALL state files across all PID directories
@@ -14,12 +17,12 @@ Responsibilities:
 - Clean up stale state files (rate-limited to 1/hour)
 """
 
+import hashlib
 import json
 import os
 import re
 import shutil
 import subprocess
-import tempfile
 import time
 from collections import defaultdict
 from datetime import datetime, timezone
@@ -48,6 +51,22 @@ BG_COLOR: str = "#1A1D23"
 # Icon used in the primary status-left prefix
 STATUS_LEFT_ICON: str = "\ue602"
 
+# Session the claude_sessions_daemon.py control client attaches to
+DAEMON_SESSION: str = "__claude_ctrl"
+
+# Sessions that only host control clients; never shown or decorated
+CONTROL_SESSIONS: frozenset[str] = frozenset({"__tun_ctrl", DAEMON_SESSION})
+
+# list-panes / list-windows formats, parsed by parse_pane_mappings / parse_windows
+PANE_FORMAT: str = "#{pane_id}\t#{session_name}\t#{window_index}"
+WINDOW_FORMAT: str = (
+    "#{session_name}\t#{window_index}\t#{window_name}\t#{window_active}\t#{session_attached}"
+    "\t#{window_id}"
+)
+
+# Global user option remembering what OptionWriter last applied
+APPLIED_OPTION: str = "@claude_applied"
+
 
 def get_tmux_bin() -> str:
     """Find the tmux binary that started this server via /proc/<pid>/exe.
@@ -120,101 +139,104 @@ def cleanup_stale_state_files() -> None:
         pass
 
 
-def get_tmux_info() -> tuple[Optional[str], Optional[int], Optional[int], str]:
-    """Get current tmux session name, server pid, active window index, and hostname."""
+def get_tmux_info() -> tuple[Optional[str], Optional[int], Optional[int], str, str]:
+    """Get current tmux session name, server pid, active window index, hostname,
+    and the APPLIED_OPTION value (see OptionWriter)."""
     try:
         result = subprocess.run(
             [
                 TMUX_BIN,
                 "display-message",
                 "-p",
-                "#{session_name}\t#{pid}\t#{window_index}\t#{?#{@host},#{@host},#{host_short}}",
+                "#{session_name}\t#{pid}\t#{window_index}\t#{?#{@host},#{@host},#{host_short}}"
+                f"\t#{{{APPLIED_OPTION}}}",
             ],
             capture_output=True,
             text=True,
             check=True,
         )
-        parts = result.stdout.strip().split("\t")
+        parts = result.stdout.strip("\n").split("\t")
         session, pid, active_window = parts[0], parts[1], parts[2]
         hostname = parts[3] if len(parts) > 3 else ""
-        return session, int(pid), int(active_window), hostname
-    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
-        return None, None, None, ""
+        applied = parts[4] if len(parts) > 4 else ""
+        return session, int(pid), int(active_window), hostname, applied
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError, IndexError):
+        return None, None, None, "", ""
+
+
+def parse_pane_mappings(output: str) -> dict[str, tuple[str, int]]:
+    """Parse list-panes output in PANE_FORMAT into pane_id -> (session_name, window_index)."""
+    mapping: dict[str, tuple[str, int]] = {}
+    for line in output.strip().split("\n"):
+        if not line or "\t" not in line:
+            continue
+        parts = line.split("\t", 2)
+        if len(parts) == 3:
+            pane_id, sess, win_idx = parts
+            if sess in CONTROL_SESSIONS:
+                continue
+            try:
+                mapping[pane_id] = (sess, int(win_idx))
+            except ValueError:
+                pass
+    return mapping
 
 
 def get_live_pane_mappings() -> dict[str, tuple[str, int]]:
     """Get pane_id -> (session_name, window_index) for ALL panes across ALL sessions."""
     try:
         result = subprocess.run(
-            [
-                TMUX_BIN,
-                "list-panes",
-                "-a",
-                "-F",
-                "#{pane_id}\t#{session_name}\t#{window_index}",
-            ],
+            [TMUX_BIN, "list-panes", "-a", "-F", PANE_FORMAT],
             capture_output=True,
             text=True,
             check=True,
         )
-        mapping: dict[str, tuple[str, int]] = {}
-        for line in result.stdout.strip().split("\n"):
-            if not line or "\t" not in line:
-                continue
-            parts = line.split("\t", 2)
-            if len(parts) == 3:
-                pane_id, sess, win_idx = parts
-                if sess == "__tun_ctrl":
-                    continue
-                try:
-                    mapping[pane_id] = (sess, int(win_idx))
-                except ValueError:
-                    pass
-        return mapping
+        return parse_pane_mappings(result.stdout)
     except (subprocess.CalledProcessError, FileNotFoundError):
         return {}
 
 
-def get_all_windows() -> list[dict]:
-    """Get all windows across all sessions with metadata.
+def parse_windows(output: str) -> list[dict]:
+    """Parse list-windows output in WINDOW_FORMAT.
 
     Returns list of dicts with keys:
-    session_name, window_index, window_name, window_active, session_attached
+    session_name, window_index, window_name, window_active, session_attached,
+    window_id
     """
+    windows = []
+    for line in output.strip().split("\n"):
+        if not line or "\t" not in line:
+            continue
+        parts = line.split("\t", 5)
+        if len(parts) == 6:
+            if parts[0] in CONTROL_SESSIONS:
+                continue
+            try:
+                windows.append(
+                    {
+                        "session_name": parts[0],
+                        "window_index": int(parts[1]),
+                        "window_name": parts[2],
+                        "window_active": parts[3] == "1",
+                        "session_attached": parts[4] == "1",
+                        "window_id": parts[5],
+                    }
+                )
+            except ValueError:
+                pass
+    return windows
+
+
+def get_all_windows() -> list[dict]:
+    """Get all windows across all sessions with metadata (see parse_windows)."""
     try:
         result = subprocess.run(
-            [
-                TMUX_BIN,
-                "list-windows",
-                "-a",
-                "-F",
-                "#{session_name}\t#{window_index}\t#{window_name}\t#{window_active}\t#{session_attached}",
-            ],
+            [TMUX_BIN, "list-windows", "-a", "-F", WINDOW_FORMAT],
             capture_output=True,
             text=True,
             check=True,
         )
-        windows = []
-        for line in result.stdout.strip().split("\n"):
-            if not line or "\t" not in line:
-                continue
-            parts = line.split("\t", 4)
-            if len(parts) == 5:
-                if parts[0] == "__tun_ctrl":
-                    continue
-                try:
-                    windows.append(
-                        {
-                            "session_name": parts[0],
-                            "window_index": int(parts[1]),
-                            "window_name": parts[2],
-                            "window_active": parts[3] == "1",
-                            "session_attached": parts[4] == "1",
-                        }
-                    )
-                except ValueError:
-                    pass
-        return windows
+        return parse_windows(result.stdout)
     except (subprocess.CalledProcessError, FileNotFoundError):
         return []
 
@@ -257,62 +279,110 @@ def format_icon_string(agents: list[tuple[str, str]]) -> str:
     return "".join(a[0] for a in agents)
 
 
-def set_window_options(
-    window_icons: dict[tuple[str, int], str],
-) -> None:
-    """Set @claude window option on windows across ALL sessions.
-
-    Args:
-        window_icons: Dict mapping (session_name, window_index) to icon string.
-    """
-    if not window_icons:
+def source_commands(commands: list[str]) -> None:
+    """Apply tmux commands in one source-file call, fed through stdin."""
+    if not commands:
         return
 
-    temp_path: Optional[str] = None
     try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            for (sess, win_idx), icon in sorted(window_icons.items(), key=lambda x: (x[0][0], x[0][1])):
-                if not isinstance(win_idx, int) or win_idx < 0:
-                    continue
-                # Sanitize session name for tmux target
-                safe_sess = re.sub(r"[^a-zA-Z0-9_./-]", "", sess)
-                if not safe_sess:
-                    continue
-                escaped_icon = (
-                    icon.replace("\\", "\\\\")
-                    .replace('"', '\\"')
-                    .replace("$", "\\$")
-                    .replace("`", "\\`")
-                    .replace("\n", "")
-                )
-                f.write(
-                    f'set-window-option -t {safe_sess}:{win_idx} @claude "{escaped_icon}"\n'
-                )
-            temp_path = f.name
-
         subprocess.run(
-            [TMUX_BIN, "source-file", temp_path],
+            [TMUX_BIN, "source-file", "-"],
+            input="".join(f"{command}\n" for command in commands),
             capture_output=True,
+            text=True,
+            encoding="utf-8",
             check=False,
         )
     except (OSError, subprocess.SubprocessError):
         pass
-    finally:
-        if temp_path:
-            try:
-                os.unlink(temp_path)
-            except OSError:
-                pass
 
 
-def set_status_lines(
+def fingerprint(text: str) -> str:
+    """Short hash of an option key or value, as remembered by OptionWriter."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest()
+
+
+class OptionWriter:
+    """Reduces option values to the commands that change something.
+
+    Options are keyed by their command up to the value, e.g. "set -g
+    status-left" or "set-window-option -t @3 @claude". The writer remembers
+    fingerprints of the values it last applied; state_command() stores them in
+    APPLIED_OPTION so the next per-tick run can pick them up from
+    get_tmux_info(). The daemon keeps one writer for its lifetime instead.
+
+    Options are assumed to be set only through a writer: a value changed
+    behind its back is only overwritten once the computed value changes.
+    """
+
+    def __init__(self, applied: str = "") -> None:
+        self.applied: dict[str, str] = {}
+        for pair in applied.split():
+            key, _, value = pair.partition(":")
+            if value:
+                self.applied[key] = value
+
+    def changes(self, options: dict[str, str]) -> list[str]:
+        """Return the commands for options whose value changed, and mark them applied."""
+        commands = []
+        for key, value in options.items():
+            key_print, value_print = fingerprint(key), fingerprint(value)
+            if self.applied.get(key_print) != value_print:
+                self.applied[key_print] = value_print
+                commands.append(f"{key} {value}")
+        return commands
+
+    def retain(self, options: dict[str, str]) -> None:
+        """Forget options not in options, e.g. those of closed windows."""
+        keep = {fingerprint(key) for key in options}
+        self.applied = {k: v for k, v in self.applied.items() if k in keep}
+
+    def state_command(self) -> str:
+        """The command storing what was applied in APPLIED_OPTION."""
+        pairs = " ".join(f"{k}:{v}" for k, v in sorted(self.applied.items()))
+        return f'set -g {APPLIED_OPTION} "{pairs}"'
+
+
+def window_options(
+    window_icons: dict[str, str],
+) -> dict[str, str]:
+    """Build the @claude window option values for windows across ALL sessions.
+
+    Args:
+        window_icons: Dict mapping window id (e.g. "@3") to icon string.
+    """
+    options = {}
+    for window_id, icon in sorted(window_icons.items()):
+        # Window ids stay put when windows are renumbered or moved, so what
+        # OptionWriter remembers for a target stays true
+        if not re.match(r"^@\d+$", window_id):
+            continue
+        escaped_icon = (
+            icon.replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("$", "\\$")
+            .replace("`", "\\`")
+            .replace("\n", "")
+        )
+        options[f"set-window-option -t {window_id} @claude"] = f'"{escaped_icon}"'
+    return options
+
+
+def set_window_options(
+    window_icons: dict[str, str],
+) -> None:
+    """Set @claude window option on windows across ALL sessions."""
+    source_commands(OptionWriter().changes(window_options(window_icons)))
+
+
+def status_line_options(
     current_session: str,
     hostname: str,
     other_session_agents: dict[str, dict[int, list[tuple[str, str]]]],
     all_windows: list[dict],
     prefix_width: int,
-) -> None:
-    """Configure multi-line status bar for other sessions.
+) -> dict[str, str]:
+    """Build the option values for the multi-line status bar for other sessions.
 
     status-format[0] is left alone (default tmux window list for current session).
     Each additional line shows one other session's windows.
@@ -322,214 +392,251 @@ def set_status_lines(
 
     total_lines = 1 + len(other_sessions)
 
-    temp_path: Optional[str] = None
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            # Set number of status lines
-            # tmux uses "on" for 1-line status; numeric values for 2+
-            if total_lines <= 1:
-                f.write("set -g status on\n")
-            else:
-                f.write(f"set -g status {total_lines}\n")
-
-            # Clear any previously-set extra status lines beyond what we need now
-            # (tmux keeps old status-format[i] around)
-            for i in range(1, MAX_EXTRA_LINES + 1):
-                if i >= total_lines:
-                    # Clear this line's format to avoid stale content
-                    f.write(f'set -g status-format[{i}] ""\n')
-
-            # Build each extra status line
-            for line_idx, sess_name in enumerate(other_sessions, start=1):
-                agents_by_window = other_session_agents[sess_name]
-                # Get all windows for this session, sorted by index
-                session_windows = sorted(
-                    [w for w in all_windows if w["session_name"] == sess_name],
-                    key=lambda w: w["window_index"],
-                )
+    options = {}
+    # Set number of status lines
+    # tmux uses "on" for 1-line status; numeric values for 2+
+    if total_lines <= 1:
+        options["set -g status"] = "on"
+    else:
+        options["set -g status"] = str(total_lines)
+
+    # Clear any previously-set extra status lines beyond what we need now
+    # (tmux keeps old status-format[i] around)
+    for i in range(1, MAX_EXTRA_LINES + 1):
+        if i >= total_lines:
+            # Clear this line's format to avoid stale content
+            options[f"set -g status-format[{i}]"] = '""'
+
+    # Build each extra status line
+    for line_idx, sess_name in enumerate(other_sessions, start=1):
+        agents_by_window = other_session_agents[sess_name]
+        # Get all windows for this session, sorted by index
+        session_windows = sorted(
+            [w for w in all_windows if w["session_name"] == sess_name],
+            key=lambda w: w["window_index"],
+        )
 
-                parts = []
-                # Session label: inactive style, padded to fixed width, clickable
-                # Pad with Python since #{p...} doesn't work inside status-format[N]
-                prefix = f"  {hostname} {sess_name}"
-                padded = prefix.ljust(prefix_width)
-                parts.append(
-                    f"#[align=left]"
-                    f"#[bg={BG_COLOR} fg={INACTIVE_COLOR}]"
-                    f"#[range=user|{sess_name}]"
-                    f"{padded}"
-                    f"#[norange]│"
-                )
+        parts = []
+        # Session label: inactive style, padded to fixed width, clickable
+        # Pad with Python since #{p...} doesn't work inside status-format[N]
+        prefix = f"  {hostname} {sess_name}"
+        padded = prefix.ljust(prefix_width)
+        parts.append(
+            f"#[align=left]"
+            f"#[bg={BG_COLOR} fg={INACTIVE_COLOR}]"
+            f"#[range=user|{sess_name}]"
+            f"{padded}"
+            f"#[norange]│"
+        )
 
-                for w_info in session_windows:
-                    win_idx = w_info["window_index"]
-                    w_name = w_info["window_name"]
-                    agents = agents_by_window.get(win_idx, [])
+        for w_info in session_windows:
+            win_idx = w_info["window_index"]
+            w_name = w_info["window_name"]
+            agents = agents_by_window.get(win_idx, [])
 
-                    if agents:
-                        icon_str = format_icon_string(agents)
-                        label = f"{win_idx}:{icon_str} {w_name}"
-                    else:
-                        label = f"{win_idx}:{w_name}"
+            if agents:
+                icon_str = format_icon_string(agents)
+                label = f"{win_idx}:{icon_str} {w_name}"
+            else:
+                label = f"{win_idx}:{w_name}"
+
+            # Clickable range targeting session:window
+            parts.append(
+                f" #[range=user|{sess_name}:{win_idx} fg={INACTIVE_COLOR}]"
+                f"{label}"
+                f" #[norange]"
+                f"#[fg={INACTIVE_COLOR}]│"
+            )
 
-                    # Clickable range targeting session:window
-                    parts.append(
-                        f" #[range=user|{sess_name}:{win_idx} fg={INACTIVE_COLOR}]"
-                        f"{label}"
-                        f" #[norange]"
-                        f"#[fg={INACTIVE_COLOR}]│"
-                    )
+        line_content = "".join(parts)
+        # Escape double quotes for tmux conf
+        escaped = line_content.replace('"', '\\"')
+        options[f"set -g status-format[{line_idx}]"] = f'"{escaped}"'
 
-                line_content = "".join(parts)
-                # Escape double quotes for tmux conf
-                escaped = line_content.replace('"', '\\"')
-                f.write(f'set -g status-format[{line_idx}] "{escaped}"\n')
+    return options
 
-            temp_path = f.name
 
-        subprocess.run(
-            [TMUX_BIN, "source-file", temp_path],
-            capture_output=True,
-            check=False,
+def set_status_lines(
+    current_session: str,
+    hostname: str,
+    other_session_agents: dict[str, dict[int, list[tuple[str, str]]]],
+    all_windows: list[dict],
+    prefix_width: int,
+) -> None:
+    """Configure multi-line status bar for other sessions (see status_line_options)."""
+    source_commands(
+        OptionWriter().changes(
+            status_line_options(
+                current_session, hostname, other_session_agents, all_windows, prefix_width
+            )
         )
-    except (OSError, subprocess.SubprocessError):
-        pass
-    finally:
-        if temp_path:
-            try:
-                os.unlink(temp_path)
-            except OSError:
-                pass
+    )
 
 
-def main() -> None:
-    current_session, current_pid, active_window, hostname = get_tmux_info()
-    if current_session is None or current_pid is None:
-        return
+def status_left_options(
+    current_session: str,
+    hostname: str,
+    prefix_width: int,
+) -> dict[str, str]:
+    """Build the status-left (primary line prefix) option values."""
+    primary_prefix = f"{STATUS_LEFT_ICON} {hostname} {current_session}"
+    padded_primary = primary_prefix.ljust(prefix_width)
+    status_left_length = prefix_width + 3  # +3 for │ + space + margin
+    escaped_prefix = (
+        padded_primary.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("$", "\\$")
+        .replace("`", "\\`")
+    )
+    return {
+        "set -g status-left": (
+            f'"#[fg={ACTIVE_COLOR},bold]{escaped_prefix}'
+            f'#[fg={INACTIVE_COLOR},nobold]│ "'
+        ),
+        "set -g status-left-length": str(status_left_length),
+    }
+
+
+def collect_agent_states(
+    current_session: str,
+    current_pid: int,
+    active_window: Optional[int],
+    pane_mappings: dict[str, tuple[str, int]],
+) -> defaultdict[tuple[str, int], list[tuple[str, str]]]:
+    """Read the state files of a tmux server and group agents by window.
 
-    cleanup_stale_state_files()
+    Auto-acknowledges waiting agents on the active window of the current
+    session and removes state files whose pane no longer exists.
 
-    # Get live pane mappings across ALL sessions
-    pane_mappings = get_live_pane_mappings()
+    Returns:
+        (session_name, window_index) -> list of (icon, duration)
+    """
     live_pane_ids = set(pane_mappings.keys())
 
-    # Get all windows across all sessions
-    all_windows = get_all_windows()
-
-    # Build set of all (session, window_index) pairs
-    all_session_windows: set[tuple[str, int]] = set()
-    for w in all_windows:
-        all_session_windows.add((w["session_name"], w["window_index"]))
-
-    # Collect agent states per (session, window)
-    # Key: (session_name, window_index) -> list of (icon, duration)
     agents_by_session_window: defaultdict[
         tuple[str, int], list[tuple[str, str]]
     ] = defaultdict(list)
 
     # Scan only current tmux server's PID directory
     current_pid_dir = STATE_BASE_DIR / str(current_pid)
-    if current_pid_dir.is_dir():
-        for state_file in current_pid_dir.glob("*.json"):
-            session_id = state_file.stem
-            ack_file = current_pid_dir / f"{session_id}.ack"
+    if not current_pid_dir.is_dir():
+        return agents_by_session_window
 
-            try:
-                state = json.loads(state_file.read_text())
-            except (json.JSONDecodeError, OSError):
-                continue
+    for state_file in current_pid_dir.glob("*.json"):
+        session_id = state_file.stem
+        ack_file = current_pid_dir / f"{session_id}.ack"
 
-            pane_id = state.get("pane_id")
-            status = state.get("status")
-            status_since = state.get("status_since", "")
+        try:
+            state = json.loads(state_file.read_text())
+        except (json.JSONDecodeError, OSError):
+            continue
 
-            # Validate pane_id format
-            if not pane_id or not re.match(r"^%\d+$", pane_id):
-                continue
+        pane_id = state.get("pane_id")
+        status = state.get("status")
+        status_since = state.get("status_since", "")
 
-            # Clean up if pane no longer exists
-            if pane_id not in live_pane_ids:
-                try:
-                    state_file.unlink(missing_ok=True)
-                    ack_file.unlink(missing_ok=True)
-                except OSError:
-                    pass
-                continue
+        # Validate pane_id format
+        if not pane_id or not re.match(r"^%\d+$", pane_id):
+            continue
 
-            # Look up which session/window this pane belongs to NOW
-            sess_name, win_idx = pane_mappings[pane_id]
-
-            # Auto-acknowledge: if this agent is waiting and is on the
-            # active window of the currently-viewed (attached) session
-            if (
-                sess_name == current_session
-                and win_idx == active_window
-                and status == "waiting"
-            ):
-                try:
-                    fd = os.open(
-                        str(ack_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY
-                    )
-                    os.close(fd)
-                    acknowledged = True
-                except FileExistsError:
-                    acknowledged = True
-                except OSError:
-                    acknowledged = ack_file.exists()
-            else:
+        # Clean up if pane no longer exists
+        if pane_id not in live_pane_ids:
+            try:
+                state_file.unlink(missing_ok=True)
+                ack_file.unlink(missing_ok=True)
+            except OSError:
+                pass
+            continue
+
+        # Look up which session/window this pane belongs to NOW
+        sess_name, win_idx = pane_mappings[pane_id]
+
+        # Auto-acknowledge: if this agent is waiting and is on the
+        # active window of the currently-viewed (attached) session
+        if (
+            sess_name == current_session
+            and win_idx == active_window
+            and status == "waiting"
+        ):
+            try:
+                fd = os.open(
+                    str(ack_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                )
+                os.close(fd)
+                acknowledged = True
+            except FileExistsError:
+                acknowledged = True
+            except OSError:
                 acknowledged = ack_file.exists()
+        else:
+            acknowledged = ack_file.exists()
 
-            icon, duration = get_agent_display(status, acknowledged, status_since)
-            agents_by_session_window[(sess_name, win_idx)].append((icon, duration))
+        icon, duration = get_agent_display(status, acknowledged, status_since)
+        agents_by_session_window[(sess_name, win_idx)].append((icon, duration))
+
+    return agents_by_session_window
+
+
+def refresh_options(
+    current_session: str,
+    current_pid: int,
+    active_window: Optional[int],
+    hostname: str,
+    pane_mappings: dict[str, tuple[str, int]],
+    all_windows: list[dict],
+) -> dict[str, str]:
+    """Build every option value for one status refresh.
+
+    claude_sessions_daemon.py builds the same options from the same helpers,
+    but only for windows whose agents changed.
+    """
+    cleanup_stale_state_files()
+
+    agents_by_session_window = collect_agent_states(
+        current_session, current_pid, active_window, pane_mappings
+    )
 
     # --- Set @claude window option on ALL windows across ALL sessions ---
-    window_icons: dict[tuple[str, int], str] = {}
-    for sess_win in all_session_windows:
+    window_icons: dict[str, str] = {}
+    for w in all_windows:
+        sess_win = (w["session_name"], w["window_index"])
         if sess_win in agents_by_session_window:
             agents = agents_by_session_window[sess_win]
-            window_icons[sess_win] = f"{format_icon_string(agents)} "
+            window_icons[w["window_id"]] = f"{format_icon_string(agents)} "
         else:
-            window_icons[sess_win] = ""
-
-    set_window_options(window_icons)
+            window_icons[w["window_id"]] = ""
 
     # --- Compute prefix width from current session name ---
     prefix_width = len(f"  {hostname} {current_session}") + 1
 
-    # --- Set status-left (primary line prefix) dynamically ---
-    primary_prefix = f"{STATUS_LEFT_ICON} {hostname} {current_session}"
-    padded_primary = primary_prefix.ljust(prefix_width)
-    status_left_length = prefix_width + 3  # +3 for │ + space + margin
-    temp_path_sl: Optional[str] = None
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            escaped_prefix = (
-                padded_primary.replace("\\", "\\\\")
-                .replace('"', '\\"')
-                .replace("$", "\\$")
-                .replace("`", "\\`")
-            )
-            f.write(
-                f'set -g status-left "#[fg={ACTIVE_COLOR},bold]{escaped_prefix}'
-                f'#[fg={INACTIVE_COLOR},nobold]│ "\n'
-            )
-            f.write(f"set -g status-left-length {status_left_length}\n")
-            temp_path_sl = f.name
-        subprocess.run(
-            [TMUX_BIN, "source-file", temp_path_sl],
-            capture_output=True,
-            check=False,
-        )
-    except (OSError, subprocess.SubprocessError):
-        pass
-    finally:
-        if temp_path_sl:
-            try:
-                os.unlink(temp_path_sl)
-            except OSError:
-                pass
+    return {
+        **window_options(window_icons),
+        **status_left_options(current_session, hostname, prefix_width),
+        **status_line_options(current_session, hostname, {}, all_windows, prefix_width),
+    }
+
+
+def main() -> None:
+    current_session, current_pid, active_window, hostname, applied = get_tmux_info()
+    if current_session is None or current_pid is None:
+        return
 
-    set_status_lines(current_session, hostname, {}, all_windows, prefix_width)
+    options = refresh_options(
+        current_session,
+        current_pid,
+        active_window,
+        hostname,
+        get_live_pane_mappings(),
+        get_all_windows(),
+    )
+
+    # Only what changed since the last run, plus the record of what that is,
+    # in one batch
+    writer = OptionWriter(applied)
+    writer.retain(options)
+    commands = writer.changes(options)
+    if commands:
+        source_commands(commands + [writer.state_command()])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Resident version of claude_sessions.py driven by tmux control mode.
+
+claude_sessions.py is started afresh by #(...) every status-interval, paying
+interpreter startup plus a display-message, list-panes, list-windows and
+source-file subprocess each time. This daemon starts once per tmux server
+(update_theme.sh launches it with run-shell -b) and attaches a control mode
+client (tmux -C) to the hidden DAEMON_SESSION:
+
+- Pane/window/client state is kept in memory and only re-listed, over the
+  control channel, when a notification (%window-add, %session-changed, ...)
+  says the layout changed
+- Option changes are written to the same channel instead of source-file,
+  and only those an OptionWriter hasn't already applied
+- State files are indexed by state_watcher.StateWatcher, and @claude is only
+  recomputed for windows whose agents changed (or show a waiting duration)
+- Refreshes happen as soon as a state file or the layout changes, and every
+  REFRESH_INTERVAL seconds for durations and auto-acknowledge
+
+A refresh that fails is logged to LOG_FILE and retried from a fresh listing
+at the next one.
+
+Only one daemon runs per server, guarded by a lock file holding its pid.
+Exits when the server goes away (%exit / EOF); update_theme_v2.sh stops it
+through the lock file when switching to the per-tick v2 script.
+"""
+
+import fcntl
+import logging
+import os
+import select
+import subprocess
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import IO, Optional
+
+from claude_sessions import (
+    DAEMON_SESSION,
+    PANE_FORMAT,
+    STATE_BASE_DIR,
+    TMUX_BIN,
+    WINDOW_FORMAT,
+    OptionWriter,
+    cleanup_stale_state_files,
+    format_icon_string,
+    get_agent_display,
+    parse_pane_mappings,
+    parse_windows,
+    status_left_options,
+    status_line_options,
+    window_options,
+)
+from state_watcher import AgentState, StateWatcher
+
+# Same cadence as the status-interval the per-tick script ran at
+REFRESH_INTERVAL: float = 2.0
+
+# Where errors go; run-shell -b has nowhere to show them
+LOG_FILE: Path = STATE_BASE_DIR.parent / "daemon.log"
+
+log = logging.getLogger("claude_sessions_daemon")
+
+# Notifications after which panes/windows/clients are re-listed
+LAYOUT_NOTIFICATIONS: frozenset[str] = frozenset(
+    {
+        "%window-add",
+        "%window-close",
+        "%window-renamed",
+        "%unlinked-window-add",
+        "%unlinked-window-close",
+        "%unlinked-window-renamed",
+        "%layout-change",
+        "%window-pane-changed",
+        "%session-changed",
+        "%session-renamed",
+        "%sessions-changed",
+        "%session-window-changed",
+        "%client-session-changed",
+        "%client-detached",
+    }
+)
+
+# Clients, to find the session/window the user is looking at (see ServerState)
+CLIENT_FORMAT: str = (
+    "#{client_activity}\t#{client_control_mode}\t#{session_name}\t#{window_index}"
+    "\t#{?#{@host},#{@host},#{host_short}}"
+)
+
+
+class ControlClient:
+    """A tmux control mode client attached to DAEMON_SESSION.
+
+    Commands are written to the client's stdin one per line; tmux answers each
+    with a %begin/%end (or %error) block, in order. Anything outside a block is
+    a notification, queued until the caller asks for it.
+    """
+
+    def __init__(self) -> None:
+        self.proc = subprocess.Popen(
+            [TMUX_BIN, "-C", "new-session", "-A", "-s", DAEMON_SESSION],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=False,
+        )
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        self._stdin: IO[bytes] = self.proc.stdin
+        self._fd: int = self.proc.stdout.fileno()
+        self._buffer: bytes = b""
+        self.notifications: deque[str] = deque()
+
+        # The reply to the attach itself, then stop tmux sending pane output
+        self._read_reply()
+        self.command("refresh-client -f no-output")
+
+    def close(self) -> None:
+        try:
+            self._stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+    def _read_line(
+        self, timeout: Optional[float], wake_fd: Optional[int] = None
+    ) -> Optional[str]:
+        """Return the next line, or None if none arrived within timeout.
+
+        Also returns None early once wake_fd, if given, is readable.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fds = [self._fd] if wake_fd is None else [self._fd, wake_fd]
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select(fds, [], [], remaining)
+            if self._fd not in readable:
+                return None
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                raise EOFError("tmux control client exited")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("utf-8", "replace").rstrip("\r")
+
+    def _read_reply(self) -> tuple[bool, list[str]]:
+        """Read up to the next %begin block, queueing notifications on the way.
+
+        Returns (succeeded, output lines).
+        """
+        while True:
+            line = self._read_line(None)
+            assert line is not None
+            if line.startswith("%begin "):
+                return self._read_block(line)
+            self._notify(line)
+
+    def _read_block(self, begin: str) -> tuple[bool, list[str]]:
+        # %end/%error carry the same time and command number as their %begin
+        guard = begin.split(" ")[1:3]
+        output = []
+        while True:
+            line = self._read_line(None)
+            assert line is not None
+            if line.startswith(("%end ", "%error ")) and line.split(" ")[1:3] == guard:
+                return line.startswith("%end "), output
+            output.append(line)
+
+    def _notify(self, line: str) -> None:
+        if line.startswith("%exit"):
+            raise EOFError("tmux control client detached")
+        if line.startswith("%"):
+            self.notifications.append(line)
+
+    def command(self, command: str) -> list[str]:
+        """Run a command and return its output lines ([] if it failed)."""
+        return self.commands([command])[0]
+
+    def commands(self, commands: list[str]) -> list[list[str]]:
+        """Run several commands in one write and return each one's output."""
+        if not commands:
+            return []
+        self._stdin.write("".join(f"{c}\n" for c in commands).encode("utf-8"))
+        self._stdin.flush()
+        results = []
+        for _ in commands:
+            ok, output = self._read_reply()
+            results.append(output if ok else [])
+        return results
+
+    def wait_notification(
+        self, timeout: float, wake_fd: Optional[int] = None
+    ) -> Optional[str]:
+        """Return the next notification, or None after timeout seconds.
+
+        Returns None early once wake_fd, if given, is readable.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.notifications:
+            line = self._read_line(max(0.0, deadline - time.monotonic()), wake_fd)
+            if line is None:
+                return None
+            if line.startswith("%begin "):
+                # A reply nobody is waiting for
+                self._read_block(line)
+            else:
+                self._notify(line)
+        return self.notifications.popleft()
+
+
+class ServerState:
+    """The tmux server as seen by the status refresh, re-listed on demand.
+
+    The current session/window is that of the most recently active
+    non-control client, standing in for what display-message reports to a
+    #(...) job.
+    """
+
+    def __init__(self, client: ControlClient) -> None:
+        self.client = client
+        self.pane_mappings: dict[str, tuple[str, int]] = {}
+        self.window_panes: dict[tuple[str, int], list[str]] = {}
+        self.window_ids: dict[tuple[str, int], str] = {}
+        self.all_windows: list[dict] = []
+        self.current_session: Optional[str] = None
+        self.active_window: Optional[int] = None
+        self.hostname: str = ""
+
+        self.server_pid: Optional[int] = None
+        try:
+            self.server_pid = int(client.command("display-message -p '#{pid}'")[0])
+        except (IndexError, ValueError):
+            pass
+
+    def reload(self) -> None:
+        panes, windows, clients = self.client.commands(
+            [
+                f"list-panes -a -F '{PANE_FORMAT}'",
+                f"list-windows -a -F '{WINDOW_FORMAT}'",
+                f"list-clients -F '{CLIENT_FORMAT}'",
+            ]
+        )
+        self.pane_mappings = parse_pane_mappings("\n".join(panes))
+        self.all_windows = parse_windows("\n".join(windows))
+        self.window_ids = {
+            (w["session_name"], w["window_index"]): w["window_id"] for w in self.all_windows
+        }
+        self.window_panes = {}
+        for pane_id, window in self.pane_mappings.items():
+            self.window_panes.setdefault(window, []).append(pane_id)
+
+        self.current_session = None
+        self.active_window = None
+        latest = -1
+        for line in clients:
+            parts = line.split("\t")
+            if len(parts) < 4 or parts[1] == "1":
+                continue
+            try:
+                activity, window = int(parts[0]), int(parts[3])
+            except ValueError:
+                continue
+            if activity > latest:
+                latest = activity
+                self.current_session = parts[2]
+                self.active_window = window
+                self.hostname = parts[4] if len(parts) > 4 else ""
+
+    def window_agents(
+        self, window: tuple[str, int], watcher: StateWatcher
+    ) -> list[AgentState]:
+        return [
+            agent
+            for pane_id in self.window_panes.get(window, [])
+            for agent in watcher.by_pane.get(pane_id, {}).values()
+        ]
+
+
+def window_icon(agents: list[AgentState]) -> str:
+    """The @claude value for a window's agents ("" for none)."""
+    if not agents:
+        return ""
+    displays = [
+        get_agent_display(a.status, a.acknowledged, a.status_since) for a in agents
+    ]
+    return f"{format_icon_string(displays)} "
+
+
+def acquire_lock() -> Optional[IO[str]]:
+    """Take the per-server daemon lock; None if another daemon holds it."""
+    parts = os.environ.get("TMUX", "").split(",")
+    server_pid = parts[1] if len(parts) >= 2 else "default"
+    lock_path = STATE_BASE_DIR.parent / f"daemon-{server_pid}.lock"
+    try:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        # Not "w": that would wipe the pid of a daemon holding the lock
+        lock_file = open(lock_path, "a")
+    except OSError:
+        return None
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.truncate(0)
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    return lock_file
+
+
+def run(client: ControlClient) -> None:
+    state = ServerState(client)
+    if state.server_pid is None:
+        return
+    watcher = StateWatcher(state.server_pid)
+    writer = OptionWriter()
+
+    # Windows whose @claude needs recomputing at the next refresh
+    dirty: set[tuple[str, int]] = set()
+    stale = True
+    next_refresh = 0.0
+    # The last error logged, so a failure repeating every refresh is logged once
+    last_error = ""
+    while True:
+        try:
+            notification = client.wait_notification(
+                max(0.0, next_refresh - time.monotonic()), watcher.fileno()
+            )
+            if notification is not None:
+                if notification.split(" ", 1)[0] in LAYOUT_NOTIFICATIONS:
+                    stale = True
+                    next_refresh = 0.0
+                # Drain whatever else is already queued before refreshing
+                continue
+
+            for pane_id in watcher.poll():
+                if pane_id in state.pane_mappings:
+                    dirty.add(state.pane_mappings[pane_id])
+                    next_refresh = 0.0
+            if time.monotonic() < next_refresh:
+                continue
+            next_refresh = time.monotonic() + REFRESH_INTERVAL
+
+            cleanup_stale_state_files()
+            if stale:
+                state.reload()
+                stale = False
+                watcher.remove_dead(set(state.pane_mappings))
+                dirty = {(w["session_name"], w["window_index"]) for w in state.all_windows}
+            if state.current_session is None:
+                continue
+
+            # Auto-acknowledge: waiting agents on the active window of the
+            # currently-viewed (attached) session
+            active = (state.current_session, state.active_window)
+            for agent in state.window_agents(active, watcher):
+                if agent.status == "waiting" and not agent.acknowledged:
+                    watcher.acknowledge(agent)
+            for pane_id in watcher.poll():
+                if pane_id in state.pane_mappings:
+                    dirty.add(state.pane_mappings[pane_id])
+
+            # Waiting durations move on without any file changing
+            for agent in watcher.agents.values():
+                if agent.status == "waiting" and not agent.acknowledged:
+                    if agent.pane_id in state.pane_mappings:
+                        dirty.add(state.pane_mappings[agent.pane_id])
+
+            window_icons = {
+                state.window_ids[window]: window_icon(state.window_agents(window, watcher))
+                for window in dirty
+                if window in state.window_ids
+            }
+            dirty = set()
+
+            prefix_width = len(f"  {state.hostname} {state.current_session}") + 1
+            client.commands(
+                writer.changes(
+                    {
+                        **window_options(window_icons),
+                        **status_left_options(
+                            state.current_session, state.hostname, prefix_width
+                        ),
+                        **status_line_options(
+                            state.current_session,
+                            state.hostname,
+                            {},
+                            state.all_windows,
+                            prefix_width,
+                        ),
+                    }
+                )
+            )
+            last_error = ""
+        except (EOFError, BrokenPipeError):
+            raise
+        except Exception as e:
+            # Keep the status line going; the next refresh starts over from a
+            # fresh listing of the server and sets every option again
+            if repr(e) != last_error:
+                log.exception("refresh failed")
+                last_error = repr(e)
+            stale = True
+            writer = OptionWriter()
+            next_refresh = time.monotonic() + REFRESH_INTERVAL
+
+
+def main() -> None:
+    lock = acquire_lock()
+    if lock is None:
+        return
+
+    logging.basicConfig(
+        filename=str(LOG_FILE),
+        level=logging.WARNING,
+        format="%(asctime)s: [sessions-daemon] %(message)s",
+    )
+    try:
+        client = ControlClient()
+    except (OSError, EOFError):
+        return
+    try:
+        run(client)
+    except (EOFError, BrokenPipeError):
+        pass
+    except Exception:
+        log.exception("exiting")
+        sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
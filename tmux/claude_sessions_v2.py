@@ -4,23 +4,46 @@ Cross-session Claude agent status for tmux — tunnel-aware version.
 
 Extends claude_sessions.py with support for tunnel sessions:
 - Queries #{session_tunnel} and #{pane_tunnel_remote_id} to discover tunnel panes
-- Uses tunnel-exec to read remote state files via the control mode channel
+- Uses tunnel-exec to read remote state files via the control mode channel,
+  all tunnels at once under one REMOTE_DEADLINE; tunnels that miss it show
+  their last known state, marked with STALE_MARKER. The reads run in a
+  detached SYNC_REMOTE_FLAG process, so late ones still update the cache
+  (within REMOTE_TIMEOUT) without holding up the status line
+- Syncs remote state incrementally through remote_state.py on the remote
+  host: only entries changed since the last sync cross the tunnel, merged
+  into the full map kept in REMOTE_CACHE_FILE
 - Maps remote pane IDs back to local windows for @claude icon display
+- Sets options through claude_sessions.py's OptionWriter, so each run only
+  sends what changed since the last one
 
 Drop-in replacement: activate via update_theme_v2.sh, revert via update_theme.sh.
 """
 
+import fcntl
 import json
 import os
 import re
+import shlex
 import subprocess
+import sys
 import tempfile
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 
+from claude_sessions import (
+    OptionWriter,
+    get_all_windows,
+    get_tmux_info,
+    source_commands,
+    status_left_options,
+    status_line_options,
+    window_options,
+)
+
 STATE_BASE_DIR: Path = Path.home() / ".claude-tmux-statusline" / "state"
 
 # Cleanup constants
@@ -32,16 +55,39 @@ WORKING_ICON: str = "🟢"
 WAITING_ICON: str = "🟡"
 ACKNOWLEDGED_ICON: str = "⚪"
 
-# Max extra status lines (to avoid taking over the whole screen)
-MAX_EXTRA_LINES: int = 4
+# All tunnels are read concurrently and share this deadline (seconds), kept
+# under the 2s status-interval so one slow tunnel can't stall the refresh
+REMOTE_DEADLINE: float = 1.5
+
+# How long a single tunnel read may take (seconds). Reads that miss
+# REMOTE_DEADLINE carry on in the background and update REMOTE_CACHE_FILE
+# for the next run, so slow tunnels still get through
+REMOTE_TIMEOUT: float = 5
+
+# Runs this script as the background process doing the tunnel reads:
+#   claude_sessions_v2.py --sync-remote '{"<tunnel>": "<exec session>", ...}'
+SYNC_REMOTE_FLAG: str = "--sync-remote"
+
+# One lock per tunnel, held while it is being read, so a read still running
+# from an earlier run isn't started again
+REMOTE_LOCK_DIR: Path = STATE_BASE_DIR.parent / "remote_locks"
+
+# Per tunnel, the remote state map as of the last sync; also what is shown
+# for tunnels that miss the deadline
+REMOTE_CACHE_FILE: Path = STATE_BASE_DIR.parent / "remote_state.json"
+# Held while updating REMOTE_CACHE_FILE; late reads of an earlier run can
+# still be writing it
+REMOTE_CACHE_LOCK: Path = STATE_BASE_DIR.parent / "remote_state.lock"
 
-# Theme colors
-ACTIVE_COLOR: str = "#b4befe"
-INACTIVE_COLOR: str = "#6c7086"
-BG_COLOR: str = "#1A1D23"
+# Sync helper on the remote host; without it the state files are cat'ed whole
+REMOTE_HELPER: str = "~/src/dotfiles/tmux/remote_state.py"
+REMOTE_STATE_GLOB: str = "~/.claude-tmux-statusline/state/*/*.json"
 
-# Icon used in the primary status-left prefix
-STATUS_LEFT_ICON: str = "\ue602"
+# Cached remote states older than this (seconds) are dropped, not shown
+MAX_REMOTE_CACHE_AGE: int = 300
+
+# Appended to the icons of windows showing cached (stale) remote state
+STALE_MARKER: str = "?"
 
 
 def get_tmux_bin() -> str:
@@ -104,28 +150,6 @@ def cleanup_stale_state_files() -> None:
         pass
 
 
-def get_tmux_info() -> tuple[Optional[str], Optional[int], Optional[int], str]:
-    """Get current tmux session name, server pid, active window index, and hostname."""
-    try:
-        result = subprocess.run(
-            [
-                TMUX_BIN,
-                "display-message",
-                "-p",
-                "#{session_name}\t#{pid}\t#{window_index}\t#{?#{@host},#{@host},#{host_short}}",
-            ],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        parts = result.stdout.strip().split("\t")
-        session, pid, active_window = parts[0], parts[1], parts[2]
-        hostname = parts[3] if len(parts) > 3 else ""
-        return session, int(pid), int(active_window), hostname
-    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
-        return None, None, None, ""
-
-
 def get_live_pane_mappings() -> tuple[
     dict[str, tuple[str, int]],
     dict[str, tuple[str, int, str, str]],
@@ -184,54 +208,25 @@ def get_live_pane_mappings() -> tuple[
         return {}, {}
 
 
-def get_all_windows() -> list[dict]:
-    """Get all windows across all sessions with metadata."""
-    try:
-        result = subprocess.run(
-            [
-                TMUX_BIN,
-                "list-windows",
-                "-a",
-                "-F",
-                "#{session_name}\t#{window_index}\t#{window_name}\t#{window_active}\t#{session_attached}",
-            ],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        windows = []
-        for line in result.stdout.strip().split("\n"):
-            if not line or "\t" not in line:
-                continue
-            parts = line.split("\t", 4)
-            if len(parts) == 5:
-                if parts[0] == "__tun_ctrl":
-                    continue
-                try:
-                    windows.append(
-                        {
-                            "session_name": parts[0],
-                            "window_index": int(parts[1]),
-                            "window_name": parts[2],
-                            "window_active": parts[3] == "1",
-                            "session_attached": parts[4] == "1",
-                        }
-                    )
-                except ValueError:
-                    pass
-        return windows
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return []
-
-
-def get_remote_state_files(tunnel_session: str) -> list[dict]:
-    """Read remote Claude state files via tunnel-exec.
+def get_remote_state_files(
+    tunnel_session: str,
+    timeout: float = REMOTE_TIMEOUT,
+    epoch: str = "",
+    generation: int = 0,
+) -> Optional[dict]:
+    """Read the remote Claude state changed since epoch:generation via tunnel-exec.
 
     Args:
         tunnel_session: A tunnel session name (e.g., "devbox/work") to exec through.
+        timeout: Seconds to wait for the tunnel.
+        epoch, generation: Where the last sync with this tunnel left off
+            (see remote_state.py); "" for a full read.
 
     Returns:
-        List of parsed JSON state dicts from the remote machine.
+        The remote_state.py response: {"epoch", "generation", "full",
+        "changed": {key: state}, "removed": [key]}, or None if the tunnel
+        failed or timed out. Remotes without the helper answer with a full
+        response under epoch "".
     """
     try:
         result = subprocess.run(
@@ -240,32 +235,216 @@ def get_remote_state_files(tunnel_session: str) -> list[dict]:
                 "tunnel-exec",
                 "-t", tunnel_session,
                 "run-shell",
-                "cat ~/.claude-tmux-statusline/state/*/*.json 2>/dev/null",
+                # || true: no state files is an empty answer, not a failure
+                f"python3 {REMOTE_HELPER} {shlex.quote(f'{epoch}:{generation}')} 2>/dev/null"
+                f" || cat {REMOTE_STATE_GLOB} 2>/dev/null || true",
             ],
             capture_output=True,
             text=True,
-            timeout=5,
+            timeout=timeout,
         )
-        if result.returncode != 0 or not result.stdout.strip():
-            return []
+        if result.returncode != 0:
+            return None
 
-        states = []
-        # Remote may have multiple JSON objects concatenated
-        # Try to parse each line or each JSON object
-        for line in result.stdout.strip().split("\n"):
-            line = line.strip()
-            if not line:
-                continue
+        lines = [line.strip() for line in result.stdout.strip().split("\n") if line.strip()]
+        try:
+            response = json.loads(lines[0]) if len(lines) == 1 else None
+        except json.JSONDecodeError:
+            response = None
+        if isinstance(response, dict) and "changed" in response:
+            return response
+
+        # No helper: the state files themselves, one JSON object per line
+        changed = {}
+        for i, line in enumerate(lines):
             try:
                 state = json.loads(line)
                 if isinstance(state, dict) and "pane_id" in state:
-                    states.append(state)
+                    changed[str(i)] = state
             except json.JSONDecodeError:
                 continue
-        return states
+        return {"epoch": "", "generation": 0, "full": True, "changed": changed, "removed": []}
     except (subprocess.CalledProcessError, subprocess.TimeoutExpired,
             FileNotFoundError):
-        return []
+        return None
+
+
+def apply_remote_changes(cached: Optional[dict], response: dict) -> dict:
+    """Merge a get_remote_state_files response into a tunnel's cached state map."""
+    entries: dict[str, dict] = {}
+    if (
+        not response.get("full")
+        and isinstance(cached, dict)
+        and cached.get("epoch") == response.get("epoch")
+    ):
+        entries = dict(cached.get("entries", {}))
+    entries.update(response.get("changed", {}))
+    for key in response.get("removed", []):
+        entries.pop(key, None)
+    return {
+        "epoch": response.get("epoch", ""),
+        "generation": response.get("generation", 0),
+        "entries": entries,
+    }
+
+
+def load_remote_cache() -> dict[str, dict]:
+    """Load tunnel_name -> {"time": epoch seconds of the last sync, "epoch",
+    "generation", "entries": {key: state}}."""
+    try:
+        cache = json.loads(REMOTE_CACHE_FILE.read_text())
+        return cache if isinstance(cache, dict) else {}
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_remote_cache(cache: dict[str, dict]) -> None:
+    """Write the remote state cache atomically."""
+    temp_path: Optional[str] = None
+    try:
+        REMOTE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=REMOTE_CACHE_FILE.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(cache, f)
+            temp_path = f.name
+        os.replace(temp_path, REMOTE_CACHE_FILE)
+        temp_path = None
+    except OSError:
+        pass
+    finally:
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+
+def update_remote_cache(tunnel_name: str, response: dict) -> None:
+    """Merge a get_remote_state_files response into REMOTE_CACHE_FILE.
+
+    Only tunnel_name's entry is touched, re-read under REMOTE_CACHE_LOCK so
+    concurrent syncs don't undo each other. A response older than the entry
+    (a straggler overtaken by a later sync) is dropped.
+    """
+    try:
+        REMOTE_CACHE_LOCK.parent.mkdir(parents=True, exist_ok=True)
+        lock = open(REMOTE_CACHE_LOCK, "a")
+    except OSError:
+        lock = None
+    try:
+        if lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = load_remote_cache()
+        cached = cache.get(tunnel_name)
+        if (
+            isinstance(cached, dict)
+            and cached.get("epoch") == response.get("epoch")
+            and cached.get("generation", 0) > response.get("generation", 0)
+        ):
+            return
+        cached = apply_remote_changes(cached, response)
+        cached["time"] = time.time()
+        cache[tunnel_name] = cached
+        save_remote_cache(cache)
+    finally:
+        if lock:
+            lock.close()
+
+
+def sync_remote_state(
+    tunnel_name: str, exec_session: str, epoch: str, generation: int
+) -> None:
+    """Sync one tunnel into REMOTE_CACHE_FILE, unless it is already being synced."""
+    lock_name = re.sub(r"[^A-Za-z0-9_.-]", "_", tunnel_name)
+    try:
+        REMOTE_LOCK_DIR.mkdir(parents=True, exist_ok=True)
+        lock = open(REMOTE_LOCK_DIR / f"{lock_name}.lock", "a")
+    except OSError:
+        return
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        response = get_remote_state_files(exec_session, REMOTE_TIMEOUT, epoch, generation)
+        if response is not None:
+            update_remote_cache(tunnel_name, response)
+    finally:
+        lock.close()
+
+
+def sync_remote_states(tunnel_exec_sessions: dict[str, str]) -> None:
+    """Sync all tunnels concurrently; the SYNC_REMOTE_FLAG process.
+
+    Each tunnel syncs from where its REMOTE_CACHE_FILE entry left off.
+    """
+    cache = load_remote_cache()
+
+    def sync_state(tunnel_name: str) -> tuple[str, int]:
+        cached = cache.get(tunnel_name)
+        if not isinstance(cached, dict):
+            return "", 0
+        return cached.get("epoch", ""), cached.get("generation", 0)
+
+    with ThreadPoolExecutor(max_workers=len(tunnel_exec_sessions)) as executor:
+        for tunnel_name, exec_session in tunnel_exec_sessions.items():
+            executor.submit(
+                sync_remote_state, tunnel_name, exec_session, *sync_state(tunnel_name)
+            )
+
+
+def get_all_remote_states(
+    tunnel_exec_sessions: dict[str, str],
+) -> dict[str, tuple[list[dict], bool]]:
+    """Read the remote state files of all tunnels, waiting at most REMOTE_DEADLINE.
+
+    The reads happen in a detached SYNC_REMOTE_FLAG process, which outlives
+    this one when a tunnel is slow: the status job returns on time, and the
+    late answer lands in REMOTE_CACHE_FILE for the next run.
+
+    Args:
+        tunnel_exec_sessions: tunnel_name -> a session name to exec through.
+
+    Returns:
+        tunnel_name -> (states, stale). Tunnels whose cache entry wasn't
+        updated within the deadline get it with stale=True, or are left
+        out if it isn't younger than MAX_REMOTE_CACHE_AGE.
+    """
+    if not tunnel_exec_sessions:
+        return {}
+
+    start = time.time()
+    try:
+        sync = subprocess.Popen(
+            [sys.executable, __file__, SYNC_REMOTE_FLAG, json.dumps(tunnel_exec_sessions)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            # Out of the status job's process group, so nothing tmux does to
+            # the job reaches it
+            start_new_session=True,
+        )
+        sync.wait(timeout=REMOTE_DEADLINE)
+    except (subprocess.TimeoutExpired, OSError):
+        pass
+
+    cache = load_remote_cache()
+    now = time.time()
+    results: dict[str, tuple[list[dict], bool]] = {}
+    for tunnel_name in tunnel_exec_sessions:
+        cached = cache.get(tunnel_name)
+        if not isinstance(cached, dict) or now - cached.get("time", 0) >= MAX_REMOTE_CACHE_AGE:
+            continue
+        stale = cached.get("time", 0) < start
+        states = [
+            state
+            for state in cached.get("entries", {}).values()
+            if isinstance(state, dict) and "pane_id" in state
+        ]
+        results[tunnel_name] = (states, stale)
+
+    return results
 
 
 def format_duration(status_since: str) -> str:
@@ -306,128 +485,8 @@ def format_icon_string(agents: list[tuple[str, str]]) -> str:
     return "".join(a[0] for a in agents)
 
 
-def set_window_options(
-    window_icons: dict[tuple[str, int], str],
-) -> None:
-    """Set @claude window option on windows across ALL sessions."""
-    if not window_icons:
-        return
-
-    temp_path: Optional[str] = None
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            for (sess, win_idx), icon in sorted(window_icons.items(), key=lambda x: (x[0][0], x[0][1])):
-                if not isinstance(win_idx, int) or win_idx < 0:
-                    continue
-                safe_sess = re.sub(r"[^a-zA-Z0-9_./-]", "", sess)
-                if not safe_sess:
-                    continue
-                escaped_icon = (
-                    icon.replace("\\", "\\\\")
-                    .replace('"', '\\"')
-                    .replace("$", "\\$")
-                    .replace("`", "\\`")
-                    .replace("\n", "")
-                )
-                f.write(
-                    f'set-window-option -t {safe_sess}:{win_idx} @claude "{escaped_icon}"\n'
-                )
-            temp_path = f.name
-
-        subprocess.run(
-            [TMUX_BIN, "source-file", temp_path],
-            capture_output=True,
-            check=False,
-        )
-    except (OSError, subprocess.SubprocessError):
-        pass
-    finally:
-        if temp_path:
-            try:
-                os.unlink(temp_path)
-            except OSError:
-                pass
-
-
-def set_status_lines(
-    current_session: str,
-    hostname: str,
-    other_session_agents: dict[str, dict[int, list[tuple[str, str]]]],
-    all_windows: list[dict],
-    prefix_width: int,
-) -> None:
-    """Configure multi-line status bar for other sessions with active agents."""
-    window_lookup: dict[tuple[str, int], dict] = {}
-    for w in all_windows:
-        window_lookup[(w["session_name"], w["window_index"])] = w
-
-    sessions_with_agents = sorted(other_session_agents.keys())[:MAX_EXTRA_LINES]
-
-    total_lines = 1 + len(sessions_with_agents)
-
-    temp_path: Optional[str] = None
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            if total_lines <= 1:
-                f.write("set -g status on\n")
-            else:
-                f.write(f"set -g status {total_lines}\n")
-
-            for i in range(1, MAX_EXTRA_LINES + 1):
-                if i >= total_lines:
-                    f.write(f'set -g status-format[{i}] ""\n')
-
-            for line_idx, sess_name in enumerate(sessions_with_agents, start=1):
-                agents_by_window = other_session_agents[sess_name]
-                sorted_windows = sorted(agents_by_window.keys())
-
-                parts = []
-                prefix = f"  {hostname} {sess_name}"
-                padded = prefix.ljust(prefix_width)
-                parts.append(
-                    f"#[align=left]"
-                    f"#[bg={BG_COLOR} fg={INACTIVE_COLOR}]"
-                    f"#[range=user|{sess_name}]"
-                    f"{padded}"
-                    f"#[norange]│"
-                )
-
-                for win_idx in sorted_windows:
-                    agents = agents_by_window[win_idx]
-                    icon_str = format_icon_string(agents)
-                    w_info = window_lookup.get((sess_name, win_idx))
-                    w_name = w_info["window_name"] if w_info else str(win_idx)
-
-                    parts.append(
-                        f" #[range=user|{sess_name}:{win_idx} fg={INACTIVE_COLOR}]"
-                        f"{win_idx}:{icon_str} {w_name}"
-                        f" #[norange]"
-                        f"#[fg={INACTIVE_COLOR}]│"
-                    )
-
-                line_content = "".join(parts)
-                escaped = line_content.replace('"', '\\"')
-                f.write(f'set -g status-format[{line_idx}] "{escaped}"\n')
-
-            temp_path = f.name
-
-        subprocess.run(
-            [TMUX_BIN, "source-file", temp_path],
-            capture_output=True,
-            check=False,
-        )
-    except (OSError, subprocess.SubprocessError):
-        pass
-    finally:
-        if temp_path:
-            try:
-                os.unlink(temp_path)
-            except OSError:
-                pass
-
-
 def main() -> None:
-    current_session, current_pid, active_window, hostname = get_tmux_info()
+    current_session, current_pid, active_window, hostname, applied = get_tmux_info()
     if current_session is None or current_pid is None:
         return
 
@@ -440,15 +499,12 @@ def main() -> None:
     # Get all windows across all sessions
     all_windows = get_all_windows()
 
-    # Build set of all (session, window_index) pairs
-    all_session_windows: set[tuple[str, int]] = set()
-    for w in all_windows:
-        all_session_windows.add((w["session_name"], w["window_index"]))
-
     # Collect agent states per (session, window)
     agents_by_session_window: defaultdict[
         tuple[str, int], list[tuple[str, str]]
     ] = defaultdict(list)
+    # Windows with agents from a tunnel that missed the deadline
+    stale_session_windows: set[tuple[str, int]] = set()
 
     # --- Step 1: Scan LOCAL state files (same as original) ---
     if STATE_BASE_DIR.exists():
@@ -508,9 +564,10 @@ def main() -> None:
         if tun_name not in tunnel_exec_sessions:
             tunnel_exec_sessions[tun_name] = sess
 
-    # For each unique tunnel, read remote state files
-    for tunnel_name, exec_session in tunnel_exec_sessions.items():
-        remote_states = get_remote_state_files(exec_session)
+    # Read every tunnel's remote state files at once
+    for tunnel_name, (remote_states, stale) in get_all_remote_states(
+        tunnel_exec_sessions
+    ).items():
         for state in remote_states:
             remote_pane_id = state.get("pane_id", "")
             status = state.get("status")
@@ -529,56 +586,40 @@ def main() -> None:
             # For tunnel sessions, we don't do auto-acknowledge (remote state)
             icon, duration = get_agent_display(status, False, status_since)
             agents_by_session_window[(local_sess, local_win)].append((icon, duration))
+            if stale:
+                stale_session_windows.add((local_sess, local_win))
 
     # --- Set @claude window option on ALL windows across ALL sessions ---
-    window_icons: dict[tuple[str, int], str] = {}
-    for sess_win in all_session_windows:
+    window_icons: dict[str, str] = {}
+    for w in all_windows:
+        sess_win = (w["session_name"], w["window_index"])
         if sess_win in agents_by_session_window:
             agents = agents_by_session_window[sess_win]
-            window_icons[sess_win] = f"{format_icon_string(agents)} "
+            marker = STALE_MARKER if sess_win in stale_session_windows else ""
+            window_icons[w["window_id"]] = f"{format_icon_string(agents)}{marker} "
         else:
-            window_icons[sess_win] = ""
-
-    set_window_options(window_icons)
+            window_icons[w["window_id"]] = ""
 
     # --- Compute prefix width from current session name ---
     prefix_width = len(f"  {hostname} {current_session}") + 1
 
-    # --- Set status-left (primary line prefix) dynamically ---
-    primary_prefix = f"{STATUS_LEFT_ICON} {hostname} {current_session}"
-    padded_primary = primary_prefix.ljust(prefix_width)
-    status_left_length = prefix_width + 3
-    temp_path_sl: Optional[str] = None
-    try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-            escaped_prefix = (
-                padded_primary.replace("\\", "\\\\")
-                .replace('"', '\\"')
-                .replace("$", "\\$")
-                .replace("`", "\\`")
-            )
-            f.write(
-                f'set -g status-left "#[fg={ACTIVE_COLOR},bold]{escaped_prefix}'
-                f'#[fg={INACTIVE_COLOR},nobold]│ "\n'
-            )
-            f.write(f"set -g status-left-length {status_left_length}\n")
-            temp_path_sl = f.name
-        subprocess.run(
-            [TMUX_BIN, "source-file", temp_path_sl],
-            capture_output=True,
-            check=False,
-        )
-    except (OSError, subprocess.SubprocessError):
-        pass
-    finally:
-        if temp_path_sl:
-            try:
-                os.unlink(temp_path_sl)
-            except OSError:
-                pass
+    options = {
+        **window_options(window_icons),
+        **status_left_options(current_session, hostname, prefix_width),
+        **status_line_options(current_session, hostname, {}, all_windows, prefix_width),
+    }
 
-    set_status_lines(current_session, hostname, {}, all_windows, prefix_width)
+    # Only what changed since the last run, plus the record of what that is,
+    # in one batch (see claude_sessions.OptionWriter)
+    writer = OptionWriter(applied)
+    writer.retain(options)
+    commands = writer.changes(options)
+    if commands:
+        source_commands(commands + [writer.state_command()])
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == SYNC_REMOTE_FLAG:
+        sync_remote_states(json.loads(sys.argv[2]))
+    else:
+        main()
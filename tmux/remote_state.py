@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Remote side of the incremental state sync used by claude_sessions_v2.py.
+
+Runs on the far end of a tunnel (through tunnel-exec run-shell) as:
+
+    remote_state.py EPOCH:GENERATION
+
+Keeps a journal of the Claude state files it has seen. Every time one
+appears, changes or disappears the journal's generation goes up, and the
+entry remembers the generation it changed at. Prints one JSON line with only
+what changed after the client's generation:
+
+    {"epoch": "...", "generation": 12, "full": false,
+     "changed": {"<pid>/<session id>": {...state...}}, "removed": ["<pid>/<session id>"]}
+
+Everything is sent instead ("full": true, nothing removed) when the client's
+epoch isn't the journal's - first contact, or the journal was recreated - or
+its generation predates removals the journal no longer remembers.
+"""
+
+import fcntl
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+STATE_BASE_DIR: Path = Path.home() / ".claude-tmux-statusline" / "state"
+
+JOURNAL_FILE: Path = STATE_BASE_DIR.parent / "remote_sync.json"
+LOCK_FILE: Path = STATE_BASE_DIR.parent / "remote_sync.lock"
+
+# How long removals are remembered (seconds); older clients get a full sync
+TOMBSTONE_AGE: int = 3600
+
+
+def new_journal() -> dict:
+    return {
+        "epoch": secrets.token_hex(8),
+        "generation": 0,
+        # Clients at a generation below this have missed forgotten removals
+        "floor": 0,
+        # key -> {"stamp": [mtime_ns, size], "generation": n, "state": {...}}
+        "entries": {},
+        # key -> {"generation": n, "time": epoch seconds}
+        "removed": {},
+    }
+
+
+def load_journal() -> dict:
+    try:
+        journal = json.loads(JOURNAL_FILE.read_text())
+    except (json.JSONDecodeError, OSError):
+        return new_journal()
+    if not isinstance(journal, dict) or set(journal) != set(new_journal()):
+        return new_journal()
+    return journal
+
+
+def save_journal(journal: dict) -> None:
+    """Write the journal atomically."""
+    temp_path: Optional[str] = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode="w", dir=JOURNAL_FILE.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(journal, f)
+            temp_path = f.name
+        os.replace(temp_path, JOURNAL_FILE)
+        temp_path = None
+    except OSError:
+        pass
+    finally:
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+
+def scan(journal: dict) -> bool:
+    """Bring the journal up to date with the state files.
+
+    Only files whose mtime or size changed are read.
+
+    Returns:
+        Whether the journal changed and needs saving.
+    """
+    entries: dict[str, dict] = journal["entries"]
+    removed: dict[str, dict] = journal["removed"]
+    dirty = False
+    seen = set()
+
+    try:
+        pid_dirs = [d for d in os.scandir(STATE_BASE_DIR) if d.is_dir()]
+    except OSError:
+        pid_dirs = []
+    for pid_dir in pid_dirs:
+        try:
+            files = list(os.scandir(pid_dir.path))
+        except OSError:
+            continue
+        for state_file in files:
+            if not state_file.name.endswith(".json"):
+                continue
+            key = f"{pid_dir.name}/{state_file.name[: -len('.json')]}"
+            seen.add(key)
+            try:
+                st = state_file.stat()
+            except OSError:
+                continue
+            stamp = [st.st_mtime_ns, st.st_size]
+            entry = entries.get(key)
+            if entry and entry["stamp"] == stamp:
+                continue
+
+            try:
+                with open(state_file.path) as f:
+                    state = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                # Probably being written; picked up next time
+                continue
+            dirty = True
+            if entry and entry["state"] == state:
+                entry["stamp"] = stamp
+                continue
+            journal["generation"] += 1
+            entries[key] = {"stamp": stamp, "generation": journal["generation"], "state": state}
+            removed.pop(key, None)
+
+    now = time.time()
+    for key in [k for k in entries if k not in seen]:
+        del entries[key]
+        journal["generation"] += 1
+        removed[key] = {"generation": journal["generation"], "time": now}
+        dirty = True
+
+    for key in [k for k, r in removed.items() if now - r["time"] > TOMBSTONE_AGE]:
+        journal["floor"] = max(journal["floor"], removed.pop(key)["generation"])
+        dirty = True
+
+    return dirty
+
+
+def changes_since(journal: dict, epoch: str, generation: int) -> dict:
+    """The response for a client at epoch:generation."""
+    full = (
+        epoch != journal["epoch"]
+        or generation < journal["floor"]
+        or generation > journal["generation"]
+    )
+    return {
+        "epoch": journal["epoch"],
+        "generation": journal["generation"],
+        "full": full,
+        "changed": {
+            key: entry["state"]
+            for key, entry in journal["entries"].items()
+            if full or entry["generation"] > generation
+        },
+        "removed": [] if full else [
+            key for key, r in journal["removed"].items() if r["generation"] > generation
+        ],
+    }
+
+
+def main() -> None:
+    epoch, _, since = (sys.argv[1] if len(sys.argv) > 1 else "").partition(":")
+    try:
+        generation = int(since)
+    except ValueError:
+        generation = 0
+
+    LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # Several local servers may sync against this host at once
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        journal = load_journal()
+        if scan(journal) or not JOURNAL_FILE.exists():
+            save_journal(journal)
+
+    print(json.dumps(changes_since(journal, epoch, generation)))
+
+
+if __name__ == "__main__":
+    main()
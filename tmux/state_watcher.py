@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+In-memory index of Claude agent state files, kept current by inotify.
+
+claude_sessions.py re-lists and re-parses every state file on each tick.
+StateWatcher reads each file once, then only re-reads files that inotify
+reports as written, moved or deleted, so a refresh costs O(changes) rather
+than O(state files). Where inotify is unavailable (not Linux, or the
+instance limit is reached) it falls back to comparing stat results, which
+still only parses changed files.
+
+State files live in STATE_BASE_DIR/<tmux server pid>/<session id>.json, with
+an empty <session id>.ack next to them once the agent was acknowledged.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from claude_sessions import STATE_BASE_DIR
+
+# inotify(7) event masks
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_FROM: int = 0x00000040
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE: int = 0x00000200
+IN_DELETE_SELF: int = 0x00000400
+IN_MOVE_SELF: int = 0x00000800
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+
+# What a state directory is watched for; IN_CREATE covers the O_EXCL .ack
+WATCH_MASK: int = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+# struct inotify_event header: wd, mask, cookie, len (name follows)
+EVENT_HEADER: struct.Struct = struct.Struct("iIII")
+
+PANE_ID_RE: re.Pattern = re.compile(r"^%\d+$")
+
+
+class AgentState(NamedTuple):
+    """One agent, as read from <session_id>.json and <session_id>.ack."""
+
+    session_id: str
+    pane_id: str
+    status: Optional[str]
+    status_since: str
+    acknowledged: bool
+
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify.
+
+    Raises OSError (or AttributeError, without the libc symbols) when
+    inotify isn't available.
+    """
+
+    def __init__(self) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd: int = fd
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """Return the pending (wd, mask, name) events without blocking."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class StateWatcher:
+    """Agent states of one tmux server, indexed by session id and by pane."""
+
+    def __init__(self, server_pid: int) -> None:
+        self.state_dir: Path = STATE_BASE_DIR / str(server_pid)
+        self.agents: dict[str, AgentState] = {}
+        self.by_pane: dict[str, dict[str, AgentState]] = {}
+
+        self._inotify: Optional[Inotify]
+        try:
+            self._inotify = Inotify()
+        except (OSError, AttributeError):
+            self._inotify = None
+        self._wd: Optional[int] = None
+        # polling fallback: file name -> (mtime_ns, size)
+        self._stamps: dict[str, tuple[int, int]] = {}
+        self._changed_panes: set[str] = set()
+
+        self.poll()
+
+    def fileno(self) -> Optional[int]:
+        """The inotify fd, readable when poll() has work; None when polling."""
+        return self._inotify.fd if self._inotify else None
+
+    def close(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+
+    def poll(self) -> set[str]:
+        """Apply state file changes since the last call.
+
+        Returns:
+            The pane ids whose agents changed.
+        """
+        if self._inotify is None:
+            self._poll_stat()
+        elif self._wd is None:
+            # The directory didn't exist (or was cleaned up); try again
+            self._rescan()
+        else:
+            session_ids = set()
+            for wd, mask, name in self._inotify.read_events():
+                if mask & IN_Q_OVERFLOW:
+                    self._rescan()
+                    session_ids.clear()
+                    break
+                if wd != self._wd:
+                    continue
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    self._wd = None
+                    self._rescan()
+                    session_ids.clear()
+                    break
+                stem, suffix = os.path.splitext(name)
+                # A new .json is still empty; its IN_CLOSE_WRITE follows
+                if suffix == ".ack" or (suffix == ".json" and not mask & IN_CREATE):
+                    session_ids.add(stem)
+            for session_id in session_ids:
+                self._reload(session_id)
+
+        changed, self._changed_panes = self._changed_panes, set()
+        return changed
+
+    def acknowledge(self, agent: AgentState) -> None:
+        """Create the agent's .ack file and mark it acknowledged right away."""
+        ack_file = self.state_dir / f"{agent.session_id}.ack"
+        try:
+            fd = os.open(str(ack_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+        except FileExistsError:
+            pass
+        except OSError:
+            if not ack_file.exists():
+                return
+        self._set(agent.session_id, agent._replace(acknowledged=True))
+
+    def remove_dead(self, live_pane_ids: set[str]) -> None:
+        """Delete the state files of agents whose pane no longer exists."""
+        for agent in list(self.agents.values()):
+            if agent.pane_id in live_pane_ids:
+                continue
+            try:
+                (self.state_dir / f"{agent.session_id}.json").unlink(missing_ok=True)
+                (self.state_dir / f"{agent.session_id}.ack").unlink(missing_ok=True)
+            except OSError:
+                pass
+            self._set(agent.session_id, None)
+
+    def _rescan(self) -> None:
+        if self._inotify and self._wd is None:
+            try:
+                self._wd = self._inotify.add_watch(self.state_dir, WATCH_MASK)
+            except OSError:
+                pass
+            # Drain events from a previous watch; everything is re-read below
+            self._inotify.read_events()
+
+        session_ids = set(self.agents)
+        try:
+            for entry in os.scandir(self.state_dir):
+                if entry.name.endswith(".json"):
+                    session_ids.add(entry.name[: -len(".json")])
+        except OSError:
+            pass
+        for session_id in session_ids:
+            self._reload(session_id)
+
+    def _poll_stat(self) -> None:
+        stamps: dict[str, tuple[int, int]] = {}
+        try:
+            for entry in os.scandir(self.state_dir):
+                if entry.name.endswith((".json", ".ack")):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    stamps[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+
+        session_ids = set()
+        for name in stamps.keys() ^ self._stamps.keys():
+            session_ids.add(os.path.splitext(name)[0])
+        for name in stamps.keys() & self._stamps.keys():
+            if stamps[name] != self._stamps[name]:
+                session_ids.add(os.path.splitext(name)[0])
+        self._stamps = stamps
+        for session_id in session_ids:
+            self._reload(session_id)
+
+    def _reload(self, session_id: str) -> None:
+        agent: Optional[AgentState] = None
+        try:
+            state = json.loads((self.state_dir / f"{session_id}.json").read_text())
+        except (json.JSONDecodeError, OSError):
+            state = None
+        if isinstance(state, dict):
+            pane_id = state.get("pane_id")
+            if pane_id and PANE_ID_RE.match(pane_id):
+                agent = AgentState(
+                    session_id,
+                    pane_id,
+                    state.get("status"),
+                    state.get("status_since", ""),
+                    (self.state_dir / f"{session_id}.ack").exists(),
+                )
+        self._set(session_id, agent)
+
+    def _set(self, session_id: str, agent: Optional[AgentState]) -> None:
+        old = self.agents.get(session_id)
+        if old == agent:
+            return
+        if old:
+            del self.agents[session_id]
+            pane_agents = self.by_pane[old.pane_id]
+            del pane_agents[session_id]
+            if not pane_agents:
+                del self.by_pane[old.pane_id]
+            self._changed_panes.add(old.pane_id)
+        if agent:
+            self.agents[session_id] = agent
+            self.by_pane.setdefault(agent.pane_id, {})[session_id] = agent
+            self._changed_panes.add(agent.pane_id)
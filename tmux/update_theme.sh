@@ -42,9 +42,12 @@ update_theme() {
 
     # Status right: side-effect-only scripts (no visible output)
     # - sync_temp_repos: sets @temp_repo per-window for cloning dir display
-    # - claude_sessions: cross-session status indicators
     # Note: window title sync is triggered by the Stop hook, not status-right
-    $TMUX_BIN set-option -g status-right "#(~/src/dotfiles/tmux/sync_temp_repos.sh)#(python3 ~/src/dotfiles/tmux/claude_sessions.py)"
+    $TMUX_BIN set-option -g status-right "#(~/src/dotfiles/tmux/sync_temp_repos.sh)"
+
+    # Cross-session status indicators: a resident claude_sessions.py driven by
+    # control mode notifications. Exits straight away if already running.
+    $TMUX_BIN run-shell -b "python3 ~/src/dotfiles/tmux/claude_sessions_daemon.py"
 
     # Bind ctrl-b w to show current session's windows only
     # Uses a temp config file because \; in shell args gets parsed as a
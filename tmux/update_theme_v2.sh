@@ -27,6 +27,16 @@ update_theme() {
     $TMUX_BIN set-option -g window-status-current-format "#[fg=$active_color,bg=$bg_color,bold]#I:#{@claude}#W"
     $TMUX_BIN set-option -g window-status-separator '#[fg=#6c7086,nobold] │ '
 
+    # Stop the claude_sessions_daemon.py started by update_theme.sh, if any,
+    # and remove the session its control client was attached to
+    local daemon_lock=~/.claude-tmux-statusline/daemon-$(echo "$TMUX" | cut -d, -f2).lock
+    if [ -f "$daemon_lock" ] && ! flock -n "$daemon_lock" true; then
+        kill "$(cat "$daemon_lock")" 2>/dev/null
+    fi
+    $TMUX_BIN kill-session -t __claude_ctrl 2>/dev/null
+    # What the options were last set to is unknown now; have the first run set them all
+    $TMUX_BIN set-option -gu @claude_applied
+
     # Use the tunnel-aware v2 script
     $TMUX_BIN set-option -g status-right "#(python3 ~/src/dotfiles/tmux/claude_sessions_v2.py)"
 